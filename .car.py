@@ -1,84 +1,177 @@
 # car.py
 import numpy as np
-from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from helper_functions import njit, NJIT_OPTIONS, prange
 
-class EngineCharacteristics(ABC):
+
+@njit(**NJIT_OPTIONS)
+def _interp_torque(rpm_points, torque_points, slopes, rpm, guess):
     """
-    Abstract base class for engine characteristics.
+    Linear interpolation of a torque curve at a single RPM.
+
+    Checks the segment `guess` (and its neighbours) before binary searching, since
+    consecutive simulation steps usually query the same segment.
+
+    Returns:
+        (torque, segment index used), torque is 0 outside of the curve.
     """
-    @abstractmethod
-    def calculate_torque(self, rpm):
-        """
-        Calculates the engine torque at a given RPM.
+    n = rpm_points.shape[0]
+    if rpm < rpm_points[0] or rpm > rpm_points[n-1]:
+        return 0.0, guess
+    i = guess
+    if not (rpm_points[i] <= rpm and rpm <= rpm_points[i+1]):
+        if i + 2 < n and rpm_points[i+1] <= rpm and rpm <= rpm_points[i+2]:
+            i += 1
+        elif i > 0 and rpm_points[i-1] <= rpm and rpm <= rpm_points[i]:
+            i -= 1
+        else:
+            # rpm equal to the first point falls in segment 0
+            i = max(np.searchsorted(rpm_points, rpm) - 1, 0)
+    return torque_points[i] + (rpm - rpm_points[i]) * slopes[i], i
+
+
+def _interp_torque_array(rpm_points, torque_points, rpm):
+    """
+    Linear interpolation of a torque curve at an array of RPMs, torque is 0 outside of the curve.
+    """
+    rpm = np.asarray(rpm, dtype=np.float64)
+    outside_curve = (rpm < rpm_points[0]) | (rpm > rpm_points[-1])
+    return np.where(outside_curve, 0.0, np.interp(rpm, rpm_points, torque_points))
 
-        Args:
-            rpm: The engine's RPM (revolutions per minute).
 
-        Returns:
-            The engine torque in Newton-meters (Nm).
-        """
-        pass
+@njit(**NJIT_OPTIONS)
+def _traction_force(front_static, weight_xfer, torque_to_force, throttle, tire_grip,
+                    motor_torque, acceleration):
+    """
+    Traction force (N) from the motor torque, limited by the grip of the rear tires.
+    The car constants are the ones precomputed in Car.__init__.
+    """
+    # Calculate normal force on rear tires with weight transfer
+    Nr = front_static + acceleration * weight_xfer
+
+    # Calculate motor force at the wheels
+    motor_force = motor_torque * torque_to_force
+
+    # Limit traction force by tire grip and motor force (a select, compiles to minsd)
+    traction = motor_force * throttle
+    grip_limit = tire_grip * Nr
+    return traction if traction < grip_limit else grip_limit
+
 
-class ElectricEngineCharacteristics(EngineCharacteristics):
+@njit(**NJIT_OPTIONS)
+def _brake_force(front_static, rear_static, weight_xfer, mg, tire_grip,
+                 brake, braking_force_distribution, acceleration):
     """
-    Represents the torque characteristics of an electric motor.
+    Front and rear braking forces (N), limited by the grip of each axle.
+    The car constants are the ones precomputed in Car.__init__.
     """
-    def __init__(self, torque_curve):
-        """
-        Initializes an ElectricEngineCharacteristics object.
+    # Calculate normal forces with weight transfer
+    Nf = rear_static - acceleration * weight_xfer
+    Nr = front_static + acceleration * weight_xfer
 
-        Args:
-            torque_curve: A list of (RPM, Torque) tuples representing the motor's torque curve.
-        """
-        self.torque_curve = torque_curve
+    # Calculate total braking force
+    total_brake_force = brake * tire_grip * mg
 
-    def calculate_torque(self, rpm):
-        """
-        Calculates the motor torque based on the RPM and the torque curve using linear interpolation.
-        """
-        if rpm < self.torque_curve[0][0]:
-            return 0  # Below minimum RPM
+    # Distribute braking force
+    braking_force_front = braking_force_distribution * total_brake_force
+    braking_force_rear = (1 - braking_force_distribution) * total_brake_force
 
-        for i in range(len(self.torque_curve) - 1):
-            rpm_low, torque_low = self.torque_curve[i]
-            rpm_high, torque_high = self.torque_curve[i+1]
+    # Limit braking force by tire grip
+    grip_front = tire_grip * Nf
+    grip_rear = tire_grip * Nr
+    braking_force_front = braking_force_front if braking_force_front < grip_front else grip_front
+    braking_force_rear = braking_force_rear if braking_force_rear < grip_rear else grip_rear
 
-            if rpm_low <= rpm <= rpm_high:
-                # Linear interpolation
-                torque = torque_low + (rpm - rpm_low) * (torque_high - torque_low) / (rpm_high - rpm_low)
-                return torque
+    return braking_force_front, braking_force_rear
 
-        return 0  # Above maximum RPM
 
-class CombustionEngineCharacteristics(EngineCharacteristics):
+@dataclass(slots=True)
+class EngineModel:
     """
-    Represents the torque characteristics of a combustion engine.
-    (This is a simplified example and can be expanded with more complex models)
+    Torque characteristics of an engine, stored as a sampled torque curve.
+
+    Electric and combustion engines only differ in how the curve is built (see
+    electric_engine and combustion_engine), so every lookup goes through the same
+    interpolation kernel instead of a per-engine-type method.
     """
-    def __init__(self, peak_torque, rpm_at_peak_torque):
+    rpm: np.ndarray        # RPM points of the curve, increasing
+    torque: np.ndarray     # Torque (Nm) at each RPM point
+    slopes: np.ndarray = field(init=False)
+    # Segment used by the previous lookup. RPM changes slowly between timesteps,
+    # so the next query almost always lands in the same or a neighbouring segment.
+    _last_idx: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self):
+        self.rpm = np.asarray(self.rpm, dtype=np.float64)
+        self.torque = np.asarray(self.torque, dtype=np.float64)
+        # The interpolation reads each point and the one after it
+        if self.rpm.ndim != 1 or self.rpm.size < 2 or self.torque.shape != self.rpm.shape:
+            raise ValueError(f"The torque curve needs at least two (rpm, torque) points, got {self.rpm.size} RPM and {self.torque.size} torque points")
+        # Slope of each curve segment, so a scalar lookup is a single multiply-add
+        self.slopes = (self.torque[1:] - self.torque[:-1]) / (self.rpm[1:] - self.rpm[:-1])
+
+    def reset(self):
         """
-        Initializes a CombustionEngineCharacteristics object.
-
-        Args:
-            peak_torque: The engine's peak torque (Nm).
-            rpm_at_peak_torque: The RPM at which the engine produces peak torque.
+        Resets the cached lookup segment, e.g. before reusing the engine for a new simulation.
         """
-        self.peak_torque = peak_torque
-        self.rpm_at_peak_torque = rpm_at_peak_torque
+        self._last_idx = 0
 
     def calculate_torque(self, rpm):
         """
-        Calculates the engine torque based on a simplified combustion engine model.
-        (This is a placeholder and can be replaced with a more accurate model)
+        Calculates the engine torque based on the RPM and the torque curve using linear interpolation.
+        Outside of the curve's RPM range the engine provides no torque.
+
+        Args:
+            rpm: A single RPM value, or an array of RPMs to evaluate in one call.
+
+        Returns:
+            The engine torque (Nm), as a float for scalar input or an array for array input.
         """
-        # A simple parabolic approximation
-        torque = self.peak_torque * (1 - ((rpm - self.rpm_at_peak_torque) / self.rpm_at_peak_torque)**2)
-        return max(0, torque)  # Ensure torque is not negative
+        if np.ndim(rpm) == 0:
+            torque, self._last_idx = _interp_torque(self.rpm, self.torque, self.slopes, float(rpm), self._last_idx)
+            return float(torque)
+
+        return _interp_torque_array(self.rpm, self.torque, rpm)
+
+
+def electric_engine(torque_curve):
+    """
+    Builds the EngineModel of an electric motor.
+
+    Args:
+        torque_curve: A list of (RPM, Torque) tuples representing the motor's torque curve.
+    """
+    return EngineModel(rpm=[p[0] for p in torque_curve], torque=[p[1] for p in torque_curve])
+
+
+def combustion_engine(peak_torque, rpm_at_peak_torque, n_points=257):
+    """
+    Builds the EngineModel of a combustion engine from a simplified parabolic model,
+    sampled on n_points between 0 and twice the RPM at peak torque (where it drops to zero).
+    (This is a placeholder and can be replaced with a more accurate model)
+
+    Args:
+        peak_torque: The engine's peak torque (Nm).
+        rpm_at_peak_torque: The RPM at which the engine produces peak torque.
+        n_points: Number of points of the sampled torque curve. Odd, so that the peak is one of them.
+    """
+    rpm = np.linspace(0.0, 2 * rpm_at_peak_torque, n_points)
+    torque = peak_torque * (1 - ((rpm - rpm_at_peak_torque) / rpm_at_peak_torque)**2)
+    return EngineModel(rpm=rpm, torque=np.maximum(0.0, torque))  # Ensure torque is not negative
 
 class Car:
     """
     Represents a vehicle with its physical and performance characteristics.
     """
+    # Fixed attribute set: slot access is cheaper than the instance __dict__ in the force calculations
+    __slots__ = (
+        'mass', 'wheelbase', 'cg_front', 'cg_rear', 'cg_height', 'track_width', 'tire_radius',
+        'drag_coeff', 'downforce_coeff', 'frontal_area', 'rolling_resistance', 'tire_grip',
+        'engine_characteristics', 'gear_ratio', 'drivetrain_efficiency', 'braking_force_distribution',
+        '_mg', '_front_static', '_rear_static', '_weight_xfer', '_rpm_from_v', '_torque_to_force',
+        '_engine_rpm', '_engine_tq', '_engine_slopes', '_engine_idx',
+        'throttle_input', 'brake_input',
+    )
     def __init__(self, mass, wheelbase, cg_front, cg_rear, cg_height, track_width, tire_radius, drag_coeff, downforce_coeff, frontal_area, rolling_resistance, tire_grip, engine_characteristics, gear_ratio, drivetrain_efficiency, braking_force_distribution):
         """
         Initializes a Car object.
@@ -96,7 +189,7 @@ class Car:
             frontal_area: Frontal area of the car (m^2).
             rolling_resistance: Rolling resistance coefficient.
             tire_grip: Tire grip coefficient.
-            engine_characteristics: An EngineCharacteristics object representing the engine's torque characteristics.
+            engine_characteristics: An EngineModel representing the engine's torque characteristics.
             gear_ratio: Gear ratio of the drivetrain.
             drivetrain_efficiency: Efficiency of the drivetrain.
             braking_force_distribution: Braking force distribution factor (0 to 1, front bias).
@@ -118,6 +211,20 @@ class Car:
         self.drivetrain_efficiency = drivetrain_efficiency
         self.braking_force_distribution = braking_force_distribution
 
+        # Constants of the force calculations, precomputed once per car
+        self._mg = mass * 9.81
+        self._front_static = self._mg * cg_front / wheelbase    # Static load on the rear axle (N)
+        self._rear_static = self._mg * cg_rear / wheelbase      # Static load on the front axle (N)
+        self._weight_xfer = mass * cg_height / wheelbase        # Load transfer per unit of acceleration (N/(m/s^2))
+        self._rpm_from_v = gear_ratio * 60.0 / (2 * np.pi * tire_radius)
+        self._torque_to_force = gear_ratio * drivetrain_efficiency / tire_radius
+
+        # Torque curve of the engine, looked up directly by the force calculations
+        self._engine_rpm = engine_characteristics.rpm
+        self._engine_tq = engine_characteristics.torque
+        self._engine_slopes = engine_characteristics.slopes
+        self._engine_idx = 0
+
         # Driver inputs
         self.throttle_input = 0.0  # Throttle input (0.0 to 1.0)
         self.brake_input = 0.0      # Brake input (0.0 to 1.0)
@@ -133,66 +240,271 @@ class Car:
         self.throttle_input = throttle
         self.brake_input = brake
 
-    def calculate_motor_torque(self, rpm):
+    def calculate_traction_force(self, velocity, acceleration):
         """
-        Calculates the motor torque based on the RPM and the torque curve using linear interpolation.
+        Calculates the traction force based on motor torque, gear ratio, tire radius, and drivetrain efficiency,
+        considering weight transfer and RWD configuration.
         """
-        if rpm < self.engine_characteristics.torque_curve[0][0]:
-            return 0  # Below minimum RPM
+        motor_torque, self._engine_idx = _interp_torque(self._engine_rpm, self._engine_tq, self._engine_slopes,
+                                                        float(velocity * self._rpm_from_v), self._engine_idx)
+        return _traction_force(self._front_static, self._weight_xfer, self._torque_to_force,
+                               self.throttle_input, self.tire_grip, motor_torque, acceleration)
 
-        for i in range(len(self.engine_characteristics.torque_curve) - 1):
-            rpm_low, torque_low = self.engine_characteristics.torque_curve[i]
-            rpm_high, torque_high = self.engine_characteristics.torque_curve[i+1]
-
-            if rpm_low <= rpm <= rpm_high:
-                # Linear interpolation
-                torque = torque_low + (rpm - rpm_low) * (torque_high - torque_low) / (rpm_high - rpm_low)
-                return torque
+    def calculate_traction_force_batch(self, velocities, accelerations):
+        """
+        Vectorized version of calculate_traction_force, evaluating a whole set of
+        velocities and accelerations (e.g. a full lap, or a Monte Carlo batch) at once.
 
-        return 0  # Above maximum RPM
+        Args:
+            velocities: Array of vehicle velocities (m/s).
+            accelerations: Array of longitudinal accelerations (m/s^2), same shape as velocities.
 
-    def calculate_traction_force(self, velocity, acceleration):
-        """
-        Calculates the traction force based on motor torque, gear ratio, tire radius, and drivetrain efficiency,
-        considering weight transfer and RWD configuration.
+        Returns:
+            Array of traction forces (N).
         """
+        velocities = np.asarray(velocities, dtype=np.float64)
+        accelerations = np.asarray(accelerations, dtype=np.float64)
+
         # Calculate normal force on rear tires with weight transfer
-        Nr = (self.mass * 9.81 * self.cg_front / self.wheelbase) + (self.mass * acceleration * self.cg_height / self.wheelbase)
-        
+        Nr = self._front_static + accelerations * self._weight_xfer
+
         # Calculate motor force at the wheels
-        rpm = (velocity * self.gear_ratio * 60) / (2 * np.pi * self.tire_radius)
-        motor_torque = self.engine_characteristics.calculate_torque(rpm)
-        wheel_torque = motor_torque * self.gear_ratio
-        motor_force = (wheel_torque * self.drivetrain_efficiency) / self.tire_radius
+        motor_force = _interp_torque_array(self._engine_rpm, self._engine_tq, velocities * self._rpm_from_v) * self._torque_to_force
 
         # Limit traction force by tire grip and motor force
-        traction_force = min(motor_force * self.throttle_input, self.tire_grip * Nr)
-        return traction_force
+        return np.minimum(motor_force * self.throttle_input, self.tire_grip * Nr)
+
+    def calculate_step_forces(self, velocity, acceleration):
+        """
+        Calculates the normal, traction and braking forces of a simulation step in a single pass,
+        sharing the normal force calculation between traction and braking.
+        Works for scalars as well as arrays of velocities and accelerations.
+
+        Args:
+            velocity: Vehicle velocity (m/s).
+            acceleration: Longitudinal acceleration (m/s^2).
+
+        Returns:
+            Tuple of (traction_force, braking_force_front, braking_force_rear, Nf, Nr) in Newtons.
+        """
+        # Normal forces with weight transfer
+        Nf = self._rear_static - acceleration * self._weight_xfer
+        Nr = self._front_static + acceleration * self._weight_xfer
+
+        # Motor force at the wheels, limited by the grip of the rear tires
+        rpm = velocity * self._rpm_from_v
+        if np.ndim(rpm) == 0:
+            motor_torque, self._engine_idx = _interp_torque(self._engine_rpm, self._engine_tq, self._engine_slopes,
+                                                            float(rpm), self._engine_idx)
+        else:
+            motor_torque = _interp_torque_array(self._engine_rpm, self._engine_tq, rpm)
+        motor_force = motor_torque * self._torque_to_force
+        traction_force = np.minimum(motor_force * self.throttle_input, self.tire_grip * Nr)
+
+        # Braking force distributed between the axles, limited by the grip of each axle
+        total_brake_force = self.brake_input * self.tire_grip * self._mg
+        braking_force_front = np.minimum(self.braking_force_distribution * total_brake_force, self.tire_grip * Nf)
+        braking_force_rear = np.minimum((1 - self.braking_force_distribution) * total_brake_force, self.tire_grip * Nr)
+
+        return traction_force, braking_force_front, braking_force_rear, Nf, Nr
 
     def calculate_brake_force(self, acceleration):
         """
         Calculates the braking force, considering weight transfer and braking force distribution.
         """
-        # Calculate normal forces with weight transfer
-        Nf = (self.mass * 9.81 * self.cg_rear / self.wheelbase) - (self.mass * acceleration * self.cg_height / self.wheelbase)
-        Nr = (self.mass * 9.81 * self.cg_front / self.wheelbase) + (self.mass * acceleration * self.cg_height / self.wheelbase)
+        return _brake_force(self._front_static, self._rear_static, self._weight_xfer, self._mg,
+                            self.tire_grip, self.brake_input, self.braking_force_distribution, acceleration)
 
-        # Calculate total braking force
-        total_brake_force = self.brake_input * self.tire_grip * self.mass * 9.81
 
-        # Distribute braking force
-        braking_force_front = self.braking_force_distribution * total_brake_force
-        braking_force_rear = (1 - self.braking_force_distribution) * total_brake_force
+@dataclass
+class CarParams:
+    """
+    Parameters of N cars stored as arrays of shape (N,), so that a whole design sweep
+    or Monte Carlo batch can be evaluated with one set of NumPy operations.
 
-        # Limit braking force by tire grip
-        braking_force_front = min(braking_force_front, self.tire_grip * Nf)
-        braking_force_rear = min(braking_force_rear, self.tire_grip * Nr)
+    The torque curves of all cars are stored as (N, K) arrays of RPM and torque points.
+    """
+    mass: np.ndarray
+    wheelbase: np.ndarray
+    cg_front: np.ndarray
+    cg_rear: np.ndarray
+    cg_height: np.ndarray
+    tire_radius: np.ndarray
+    tire_grip: np.ndarray
+    gear_ratio: np.ndarray
+    drivetrain_efficiency: np.ndarray
+    braking_force_distribution: np.ndarray
+    throttle_input: np.ndarray
+    brake_input: np.ndarray
+    torque_curve_rpm: np.ndarray
+    torque_curve_torque: np.ndarray
+    # Highest RPM of each car's own curve, defaults to the last column of torque_curve_rpm
+    # (curves shorter than K are padded past their end, see from_cars)
+    max_rpm: np.ndarray = None
+    # Torque curve segment used by the previous lookup of each car
+    segment: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        if self.max_rpm is None:
+            self.max_rpm = self.torque_curve_rpm[:, -1].copy()
+        self.segment = np.zeros(self.torque_curve_rpm.shape[0], dtype=np.intp)
+
+    @classmethod
+    def from_cars(cls, cars):
+        """
+        Builds a CarParams batch from a list of Car objects.
 
-        return braking_force_front, braking_force_rear
+        Torque curves may have different lengths, so electric and combustion engines can be
+        mixed in one batch: shorter curves are padded with points past their last RPM, which
+        are never used since the car gets no torque above it.
+        """
+        def column(name):
+            return np.array([getattr(car, name) for car in cars], dtype=np.float64)
+
+        engines = [car.engine_characteristics for car in cars]
+        n_points = max(len(engine.rpm) for engine in engines)
+        rpm_points = np.empty((len(cars), n_points))
+        torque_points = np.empty((len(cars), n_points))
+        for i, engine in enumerate(engines):
+            k = len(engine.rpm)
+            rpm_points[i, :k] = engine.rpm
+            rpm_points[i, k:] = engine.rpm[-1] + np.arange(1, n_points - k + 1)
+            torque_points[i, :k] = engine.torque
+            torque_points[i, k:] = engine.torque[-1]
+
+        return cls(
+            mass=column('mass'),
+            wheelbase=column('wheelbase'),
+            cg_front=column('cg_front'),
+            cg_rear=column('cg_rear'),
+            cg_height=column('cg_height'),
+            tire_radius=column('tire_radius'),
+            tire_grip=column('tire_grip'),
+            gear_ratio=column('gear_ratio'),
+            drivetrain_efficiency=column('drivetrain_efficiency'),
+            braking_force_distribution=column('braking_force_distribution'),
+            throttle_input=column('throttle_input'),
+            brake_input=column('brake_input'),
+            torque_curve_rpm=rpm_points,
+            torque_curve_torque=torque_points,
+            max_rpm=np.array([engine.rpm[-1] for engine in engines]),
+        )
+
+
+def calculate_motor_torque(params, rpm):
+    """
+    Motor torque (Nm) of every car in the batch at the given RPM(s), interpolated on each car's
+    own torque curve. Cars outside of their curve's RPM range get no torque.
+    """
+    rpm_points = params.torque_curve_rpm
+    torque_points = params.torque_curve_torque
+    n_cars, n_points = rpm_points.shape
+    rpm = np.broadcast_to(np.asarray(rpm, dtype=np.float64), (n_cars,))
+
+    # Only search again for cars that left the segment used by the previous lookup
+    idx = params.segment[:, None]
+    low = np.take_along_axis(rpm_points, idx, axis=1)[:, 0]
+    high = np.take_along_axis(rpm_points, idx + 1, axis=1)[:, 0]
+    stale = (rpm < low) | (rpm > high)
+    if stale.any():
+        count_below = (rpm_points[stale] <= rpm[stale, None]).sum(axis=1)
+        params.segment[stale] = np.clip(count_below - 1, 0, n_points - 2)
+        idx = params.segment[:, None]
+
+    rpm_low = np.take_along_axis(rpm_points, idx, axis=1)[:, 0]
+    rpm_high = np.take_along_axis(rpm_points, idx + 1, axis=1)[:, 0]
+    torque_low = np.take_along_axis(torque_points, idx, axis=1)[:, 0]
+    torque_high = np.take_along_axis(torque_points, idx + 1, axis=1)[:, 0]
+    torque = torque_low + (rpm - rpm_low) * (torque_high - torque_low) / (rpm_high - rpm_low)
+
+    outside_curve = (rpm < rpm_points[:, 0]) | (rpm > params.max_rpm)
+    return np.where(outside_curve, 0.0, torque)
+
+
+@njit(parallel=True, **NJIT_OPTIONS)
+def step_cars(mass, wheelbase, cg_front, cg_height, gear_ratio, tire_radius, eta, throttle, tire_grip,
+              rpm_curve, tq_curve, max_rpm, velocity, acceleration, out_traction):
+    """
+    Traction force (N) of every car of an ensemble for one simulation step, computed in parallel
+    over the cars. All arguments are arrays of shape (N,), except the (N, K) torque curves.
+    The result is written into out_traction.
+    """
+    n_points = rpm_curve.shape[1]
+    for i in prange(mass.shape[0]):
+        # Motor torque from the car's own torque curve, none outside of it
+        rpm = (velocity[i] * gear_ratio[i] * 60) / (2 * np.pi * tire_radius[i])
+        motor_torque = 0.0
+        if rpm >= rpm_curve[i, 0] and rpm <= max_rpm[i]:
+            j = min(max(np.searchsorted(rpm_curve[i], rpm) - 1, 0), n_points - 2)
+            slope = (tq_curve[i, j+1] - tq_curve[i, j]) / (rpm_curve[i, j+1] - rpm_curve[i, j])
+            motor_torque = tq_curve[i, j] + (rpm - rpm_curve[i, j]) * slope
+
+        # Normal force on rear tires with weight transfer
+        Nr = mass[i] * (9.81 * cg_front[i] + acceleration[i] * cg_height[i]) / wheelbase[i]
+
+        # Motor force at the wheels, limited by tire grip
+        motor_force = motor_torque * gear_ratio[i] * eta[i] / tire_radius[i] * throttle[i]
+        grip_limit = tire_grip[i] * Nr
+        out_traction[i] = motor_force if motor_force < grip_limit else grip_limit
+
+
+def step_traction_force(params, velocity, acceleration, out=None):
+    """
+    Traction force (N) of every car in the batch using the parallel step_cars kernel.
+    Unlike calculate_traction_force, it does not use the cached curve segments.
 
+    Args:
+        params: CarParams of the N cars.
+        velocity: Velocity of each car (m/s), scalar or array of shape (N,).
+        acceleration: Longitudinal acceleration of each car (m/s^2), scalar or array of shape (N,).
+        out: Optional array of shape (N,) to write the result into, reused between steps.
 
+    Returns:
+        Array of traction forces (N).
+    """
+    n_cars = params.mass.shape[0]
+    if out is None:
+        out = np.empty(n_cars)
+    velocity = np.ascontiguousarray(np.broadcast_to(np.asarray(velocity, dtype=np.float64), (n_cars,)))
+    acceleration = np.ascontiguousarray(np.broadcast_to(np.asarray(acceleration, dtype=np.float64), (n_cars,)))
+    step_cars(params.mass, params.wheelbase, params.cg_front, params.cg_height, params.gear_ratio,
+              params.tire_radius, params.drivetrain_efficiency, params.throttle_input, params.tire_grip,
+              params.torque_curve_rpm, params.torque_curve_torque, params.max_rpm,
+              velocity, acceleration, out)
+    return out
+
+
+def calculate_traction_force(params, velocity, acceleration):
+    """
+    Traction force (N) of every car in the batch. velocity and acceleration are either scalars
+    or arrays of shape (N,).
+    """
+    # Calculate normal force on rear tires with weight transfer
+    Nr = (params.mass * 9.81 * params.cg_front / params.wheelbase) + (params.mass * acceleration * params.cg_height / params.wheelbase)
 
+    # Calculate motor force at the wheels
+    rpm = (velocity * params.gear_ratio * 60) / (2 * np.pi * params.tire_radius)
+    motor_torque = calculate_motor_torque(params, rpm)
+    wheel_torque = motor_torque * params.gear_ratio
+    motor_force = (wheel_torque * params.drivetrain_efficiency) / params.tire_radius
 
+    # Limit traction force by tire grip and motor force
+    return np.minimum(motor_force * params.throttle_input, params.tire_grip * Nr)
+
+
+def calculate_brake_force(params, acceleration):
+    """
+    Front and rear braking forces (N) of every car in the batch.
+    """
+    # Calculate normal forces with weight transfer
+    Nf = (params.mass * 9.81 * params.cg_rear / params.wheelbase) - (params.mass * acceleration * params.cg_height / params.wheelbase)
+    Nr = (params.mass * 9.81 * params.cg_front / params.wheelbase) + (params.mass * acceleration * params.cg_height / params.wheelbase)
 
+    # Calculate total braking force
+    total_brake_force = params.brake_input * params.tire_grip * params.mass * 9.81
 
+    # Distribute braking force, limited by tire grip
+    braking_force_front = np.minimum(params.braking_force_distribution * total_brake_force, params.tire_grip * Nf)
+    braking_force_rear = np.minimum((1 - params.braking_force_distribution) * total_brake_force, params.tire_grip * Nr)
 
+    return braking_force_front, braking_force_rear
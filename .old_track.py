@@ -1,7 +1,6 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-import pandas as pd
 
 class TrackSegment:
     def __init__(self, segment_type, length, curvature):
@@ -11,77 +10,93 @@ class TrackSegment:
 
     def simulate_segment(self, current_x, current_y, current_angle, step_size=1.0):
         """Simulate movement through the segment and update position and angle."""
-        x_points = [current_x]
-        y_points = [current_y]
-
         if self.type == "straight":
             # Move straight in the current direction
-            dx = self.length * np.cos(current_angle)
-            dy = self.length * np.sin(current_angle)
-            current_x += dx
-            current_y += dy
-            x_points.append(current_x)
-            y_points.append(current_y)
-        else:
-            # Curved segment: calculate the arc
-            radius = 1 / abs(self.curvature)
-            theta = self.length / radius  # Angle in radians
-
-            # Determine the center of the circle
-            if self.curvature > 0:  # Left turn
-                center_x = current_x - radius * np.sin(current_angle)
-                center_y = current_y + radius * np.cos(current_angle)
-            else:  # Right turn
-                center_x = current_x + radius * np.sin(current_angle)
-                center_y = current_y - radius * np.cos(current_angle)
-
-            # Generate points along the arc
-            num_steps = int(np.ceil(theta / (step_size / radius)))
-            delta_theta = theta / num_steps
-            for _ in range(num_steps):
-                if self.curvature > 0:  # Left turn
-                    current_angle += delta_theta
-                else:  # Right turn
-                    current_angle -= delta_theta
-                current_x = center_x + radius * np.cos(current_angle + np.pi/2) if self.curvature > 0 else center_x + radius * np.cos(current_angle - np.pi/2)
-                current_y = center_y + radius * np.sin(current_angle + np.pi/2) if self.curvature > 0 else center_y + radius * np.sin(current_angle - np.pi/2)
-                x_points.append(current_x)
-                y_points.append(current_y)
-
-        return x_points, y_points, current_x, current_y, current_angle
+            x_points = np.array([current_x, current_x + self.length * np.cos(current_angle)])
+            y_points = np.array([current_y, current_y + self.length * np.sin(current_angle)])
+            return x_points, y_points, x_points[-1], y_points[-1], current_angle
+
+        # Curved segment: calculate the arc
+        radius = 1 / abs(self.curvature)
+        theta = self.length / radius  # Angle in radians
+        sign = 1.0 if self.curvature > 0 else -1.0  # Left turn if positive
+
+        # Determine the center of the circle
+        center_x = current_x - sign * radius * np.sin(current_angle)
+        center_y = current_y + sign * radius * np.cos(current_angle)
+
+        # Generate all points along the arc at once
+        num_steps = int(np.ceil(theta / (step_size / radius)))
+        delta_theta = theta / num_steps
+        thetas = current_angle + sign * np.arange(1, num_steps + 1) * delta_theta
+        x_points = np.concatenate(([current_x], center_x + radius * np.cos(thetas - sign * np.pi/2)))
+        y_points = np.concatenate(([current_y], center_y + radius * np.sin(thetas - sign * np.pi/2)))
+
+        return x_points, y_points, x_points[-1], y_points[-1], thetas[-1]
+
+    def heading_steps(self, step_size=1.0):
+        """
+        Heading change and chord length of each step through the segment, so that a whole
+        track can be integrated at once (see Track.centerline).
+
+        Returns:
+            (dtheta, ds) arrays: heading change (rad) and length of the straight line (m) of each step.
+        """
+        if self.type == "straight":
+            return np.zeros(1), np.array([self.length], dtype=np.float64)
+
+        radius = 1 / abs(self.curvature)
+        theta = self.length / radius  # Angle in radians
+        num_steps = int(np.ceil(theta / (step_size / radius)))
+        delta_theta = theta / num_steps
+        # Each step follows the chord between two points of the arc
+        chord = 2 * radius * np.sin(delta_theta / 2)
+        sign = 1.0 if self.curvature > 0 else -1.0  # Left turn if positive
+        return np.full(num_steps, sign * delta_theta), np.full(num_steps, chord)
 
 
 class Track:
     def __init__(self, segments):
         self.segments = segments  # List of TrackSegment objects
+        # Segment data as arrays, for the vectorized track calculations
+        self.types = np.array([segment.type for segment in segments])
+        self.lengths = np.array([segment.length for segment in segments], dtype=np.float64)
+        self.curvatures = np.array([segment.curvature for segment in segments], dtype=np.float64)
 
     @classmethod
     def from_csv(cls, file_path):
         """Load track segments from a CSV and create a Track object."""
-        segments = []
-        df = pd.read_csv(file_path)
-        for _, row in df.iterrows():
-            segment_type = row['Type']
-            length = row['Section Length']
-            curvature = row['Corner Radius']
-            segments.append(TrackSegment(segment_type, length, curvature))
+        # Column names lose their spaces: 'Section Length' -> 'Section_Length'
+        arr = np.atleast_1d(np.genfromtxt(file_path, delimiter=',', dtype=None, names=True, encoding=None))
+        lengths = arr['Section_Length'].astype(np.float64)
+        curvatures = arr['Corner_Radius'].astype(np.float64)
+        segments = [TrackSegment(segment_type, length, curvature)
+                    for segment_type, length, curvature in zip(arr['Type'], lengths, curvatures)]
         return cls(segments)
 
+    def centerline(self, step_size=1.0, start_x=0.0, start_y=0.0, start_angle=0.0):
+        """
+        Points along the centerline of the whole track, starting facing the x-axis at the origin.
+
+        The heading changes of all segments are accumulated with a single cumsum, and the
+        positions with a cumsum of the step vectors, instead of walking the arcs step by step.
+
+        Returns:
+            (x, y) arrays of the track points (m).
+        """
+        steps = [segment.heading_steps(step_size) for segment in self.segments]
+        dtheta = np.concatenate([step[0] for step in steps])
+        ds = np.concatenate([step[1] for step in steps])
+
+        # Each chord points halfway between the headings at its two ends
+        angles = start_angle + np.cumsum(dtheta) - dtheta / 2
+        x = start_x + np.concatenate(([0.0], np.cumsum(np.cos(angles) * ds)))
+        y = start_y + np.concatenate(([0.0], np.cumsum(np.sin(angles) * ds)))
+        return x, y
+
     def plot_full_track(self):
         """Simulate and plot the entire track."""
-        # Initialize car position and direction
-        current_x, current_y = 0.0, 0.0
-        current_angle = 0.0  # Start facing the x-axis
-
-        # Initialize lists to store all points
-        all_x_points = [current_x]
-        all_y_points = [current_y]
-
-        # Simulate each segment
-        for segment in self.segments:
-            x_points, y_points, current_x, current_y, current_angle = segment.simulate_segment(current_x, current_y, current_angle)
-            all_x_points.extend(x_points[1:])  # Skip the first point (duplicate of the last point of the previous segment)
-            all_y_points.extend(y_points[1:])
+        all_x_points, all_y_points = self.centerline()
 
         # Plot the full track
         plt.figure(figsize=(10, 6))
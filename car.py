@@ -1,8 +1,11 @@
+import logging
+import math
+import numpy as np
 import pandas as pd
-from tires.magic_formula_tire import MagicFormulaTire
+from tires.magic_formula_tire import MagicFormulaTire, MagicFormulaTireBatch
 from tires.tire_class import PhysicalTire
 from motor import *
-from helper_functions import TimeSeriesStorage, combine_dataframes, append_new_rows
+from helper_functions import ArrayTimeSeriesStorage, ArrayTimeSeriesView, write_csv, njit, CAR_NJIT_OPTIONS, prange
 
 from logger import setup_logger
         
@@ -23,6 +26,134 @@ logger.info("Starting Car.py Script")
 #     logger.exception("An error occurred")
 #
 
+@njit(**CAR_NJIT_OPTIONS)
+def vertical_load_kernel(a_x, a_y, static_loads, lt_long_coef, lt_lat_coef, Fz_out):
+    """
+    Vertical load on the four tires (front_right, front_left, rear_right, rear_left) from their
+    static loads and the load transfer caused by the car's acceleration.
+
+    Args:
+        a_x, a_y: Longitudinal and lateral acceleration (m/s^2), or length-N_p arrays for N_p car designs.
+        static_loads: Length-4 array of the static load on each tire (N), or (4, N_p).
+        lt_long_coef: Longitudinal load transfer per tire per unit of acceleration, m*h_cog/(2*wheelbase).
+        lt_lat_coef: Lateral load transfer per tire per unit of acceleration, m*h_cog/(2*track_width).
+        Fz_out: Array shaped like static_loads the vertical loads (N) are written into.
+    """
+    # Accelerating moves load from the front tires to the rear ones, and lateral acceleration to the right side
+    load_transfer_long = a_x*lt_long_coef
+    load_transfer_lat = a_y*lt_lat_coef
+
+    Fz_out[0] = static_loads[0] - load_transfer_long + load_transfer_lat
+    Fz_out[1] = static_loads[1] - load_transfer_long - load_transfer_lat
+    Fz_out[2] = static_loads[2] + load_transfer_long + load_transfer_lat
+    Fz_out[3] = static_loads[3] + load_transfer_long - load_transfer_lat
+
+
+@njit(**CAR_NJIT_OPTIONS)
+def row_sum_kernel(block, rows, out):
+    """
+    Sum the given rows of a small (n_forces, n_tires) block into out, as plain adds rather than a
+    ufunc reduction (the arrays are a handful of values, so the call overhead of .sum() dominates).
+
+    Args:
+        block: (n_forces, n_tires) array of forces.
+        rows: Integer array of the rows to add up.
+        out: Length n_tires array the sums are written into.
+    """
+    for j in range(block.shape[1]):
+        total = 0.0
+        for i in rows:
+            total += block[i, j]
+        out[j] = total
+
+
+@njit(**CAR_NJIT_OPTIONS)
+def body_force_kernel(fx, fy, mz, delta, r, k_align):
+    """
+    Rotate the forces of the four tires by their steering angles into the body frame and sum them.
+
+    Args:
+        fx, fy: Length-4 arrays of the x and y forces in each tire's frame (N).
+        mz: Length-4 array of the tires' aligning moments (Nm).
+        delta: Length-4 array of the steering angles (rad).
+        r: (4, 3) array of the tire positions relative to the reference point (m).
+        k_align: Factor applied to the aligning moments.
+
+    Returns:
+        (Fx_total, Fy_total, Mz_total) in the body frame.
+    """
+    fx_total = 0.0
+    fy_total = 0.0
+    mz_total = 0.0
+    for i in range(4):
+        c = math.cos(delta[i])
+        s = math.sin(delta[i])
+        fx_body = fx[i]*c - fy[i]*s
+        fy_body = fx[i]*s + fy[i]*c
+        fx_total += fx_body
+        fy_total += fy_body
+        mz_total += k_align*mz[i] + r[i, 0]*fy_body - r[i, 1]*fx_body
+    return fx_total, fy_total, mz_total
+
+
+@njit(**CAR_NJIT_OPTIONS)
+def motion_kernel(fx, fy, fz, torque_z, acceleration, velocity, position, yaw_velocity, yaw_angle, mass, z_inertia, dt):
+    """
+    Advance the car's linear and yaw motion by one timestep under the resultant force and torque.
+    The acceleration, velocity and position (x, y, z) arrays are updated in place; the motion stays
+    in the ground plane, so the z velocity and position are kept at 0.
+
+    Returns:
+        (yaw_velocity, yaw_angle)
+    """
+    # Calculate new acceleration
+    acceleration[0] = fx / mass
+    acceleration[1] = fy / mass
+    acceleration[2] = fz / mass
+    for i in range(2):
+        # Update velocity: v_new = v_old + a_new * dt
+        velocity[i] = velocity[i] + acceleration[i] * dt
+        # Update position: p_new = p_old + v_new * dt + 0.5 * a_new * dt²
+        position[i] = position[i] + velocity[i] * dt + 0.5 * acceleration[i] * dt**2
+    velocity[2] = 0.0
+    position[2] = 0.0
+
+    # Calculate angular acceleration: α = τ/I
+    angular_acceleration = torque_z / z_inertia
+    # Update angular velocity: ω_new = ω_old + α * dt
+    yaw_velocity = yaw_velocity + angular_acceleration * dt
+    # Update yaw angle: θ_new = θ_old + ω_new * dt + 0.5 * α * dt²
+    yaw_angle = yaw_angle + yaw_velocity * dt + 0.5 * angular_acceleration * dt**2
+
+    return yaw_velocity, yaw_angle
+
+
+@njit(parallel=True, **CAR_NJIT_OPTIONS)
+def sweep_motion_kernel(fx, fy, acceleration, velocity, position, mass, dt):
+    """
+    Advance the straight-line motion of N_p independent designs by one timestep, one design per
+    thread. Same integration as motion_kernel, with the (4, N_p) tire forces summed per design and
+    the (3, N_p) acceleration, velocity and position arrays updated in place.
+    """
+    n_tires = fx.shape[0]
+    for j in prange(mass.shape[0]):
+        # Resultant force of the design's tires
+        force_x = 0.0
+        force_y = 0.0
+        for i in range(n_tires):
+            force_x += fx[i, j]
+            force_y += fy[i, j]
+
+        acceleration[0, j] = force_x / mass[j]
+        acceleration[1, j] = force_y / mass[j]
+        acceleration[2, j] = 0.0
+        for k in range(2):
+            velocity[k, j] = velocity[k, j] + acceleration[k, j] * dt
+            position[k, j] = position[k, j] + velocity[k, j] * dt + 0.5 * acceleration[k, j] * dt**2
+        velocity[2, j] = 0.0
+        position[2, j] = 0.0
+
+
 class Car:
     def __init__(
         self,
@@ -34,6 +165,7 @@ class Car:
         h_cog: float,           # [m] height of center of gravity
         track_width: float,     # [m] track width 
         # Parameters
+        n_steps: int = 1024,    # Timesteps preallocated in the storages (they grow if the simulation runs longer)
     ):
         self.mass = mass
         self.vehicle_weight = self.mass*9.81
@@ -48,39 +180,85 @@ class Car:
 
         # Physical Parameters
         self.z_inertia = 1/12*self.mass*(self.wheelbase**2+self.track_width**2)
+        # Static load on each tire (front_right, front_left, rear_right, rear_left) and the load transfer
+        # coefficients, fixed by the geometry
+        # (moment balance about each axle: the front axle carries the share of the rear distance and vice versa)
+        self._Fz_static_front_half = 0.5*self.vehicle_weight*self.dist_r/self.wheelbase
+        self._Fz_static_rear_half = 0.5*self.vehicle_weight*self.dist_f/self.wheelbase
+        self._static_loads = np.array([self._Fz_static_front_half, self._Fz_static_front_half,
+                                       self._Fz_static_rear_half, self._Fz_static_rear_half])
+        self._h_over_L = self.h_cog/self.wheelbase
+        self._h_over_W = self.h_cog/self.track_width
+        self._lt_long_coef = 0.5*self.mass*self._h_over_L
+        self._lt_lat_coef = 0.5*self.mass*self._h_over_W
         # Program Parameters 
         self.force_lag = 5          # Changing to millisecond based time series. 
         self.timestep = 5           # Changing to millisecond based time series. 
+        self._dt = self.timestep / 100.0    # Integration step of the motion
         self.current_time= 0
+        self.n_steps = n_steps
 
         # self.all_forces = [self.front_right, self.front_left, self.rear_right, self.rear_left]
          
         # Transient Parameters (origin is cog)
-        self.acceleration = (0,0,0) # x, y, z
-        self.velocity = (0,0,0)     # x, y, z
-        self.position = (0,0,0)     # x, y, z
-        self.yaw_angle = 0          # Angle, radians?
-        self.yaw_velocity = 0          # Angle, radians?
+        self.acceleration = np.zeros(3) # x, y, z
+        self.velocity = np.zeros(3)     # x, y, z
+        self.position = np.zeros(3)     # x, y, z
+        self.yaw_angle = 0.0        # Yaw angle (rad), not wrapped
+        self.yaw_angle_wrapped = 0.0    # Yaw angle wrapped to (-2π, 2π), for reporting
+        self.yaw_velocity = 0.0     # Yaw rate (rad/s)
 
         # Initialize Forces
-        self.vehicle_details = TimeSeriesStorage({"time": [0.0], "acceleration": [0], "velocity": [0], "position": [0]}, 'vehicle_dataframe', col_types={"acceleration": 'object', "velocity": 'object', "position": 'object'})
-        self.vehicle_details.update({"velocity": self.velocity, "position": self.position}, self.current_time+self.timestep)
+        # Preallocated history of the car's motion, one float column per component and one row per timestep
+        vehicle_columns = {"time": [0]}
+        vehicle_columns.update({f"{quantity}_{axis}": [0.0] for quantity in ("acceleration", "velocity", "position") for axis in ("x", "y", "z")})
+        self.vehicle_details = ArrayTimeSeriesStorage(vehicle_columns, 'vehicle_dataframe', n_steps=self.n_steps, timestep=self.timestep)
+        self.vehicle_details.update(self.motion_state(), self.current_time+self.timestep)
+        self._accel_cols = (self.vehicle_details.column_index("acceleration_x"), self.vehicle_details.column_index("acceleration_y"))
         self.initialize_forces()
 
         # Put all forces into a list 
         self.all_force_points = [self.front_right, self.front_left, self.rear_right, self.rear_left, self.cnt_grav]
         # Define big transient dataframe 
-        self.all_dataframes_for_update = [(self.vehicle_details, "car"), (self.front_right.forces, "front_right"),(self.front_left.forces, "front_left"),(self.rear_right.forces, "rear_right"),(self.rear_left.forces, "rear_left"), (self.cnt_grav.forces, "cnt_grav")]
-        self.full_dataset = combine_dataframes(self.all_dataframes_for_update)
+        # Last timestep recorded in the full dataset, which is only assembled when it is read
+        self.recorded_time = self.current_time
 
     def initialize_forces(self):
+        tire_forces = {"vertical_load":['z'], "x_friction":['x'], "y_friction":['y'], "rolling_resistance":['x']}
+        cnt_grav_forces = {"inertial_z":['z'], "inertial_x":['x'], "inertial_y":['y']}
+
+        # All the forces of the car live in one preallocated storage, the tires' columns grouped by force followed by
+        # the center of gravity's. Each force point is a view of its own columns.
+        force_columns = {"time": [0]}
+        force_columns.update({column: [0] for column in TireArray.column_names(tire_forces)})
+        force_columns.update({f"cnt_grav_{force}": [0] for force in cnt_grav_forces})
+        self.forces = ArrayTimeSeriesStorage(force_columns, "forces", n_steps=self.n_steps, timestep=self.timestep)
+        # Columns of the full dataset, grouped by force point
+        self.dataset_columns = [f"{name}_{force}" for name in TireArray.names for force in tire_forces] + [f"cnt_grav_{force}" for force in cnt_grav_forces]
+
+        # The four tires as a structure of arrays over their block of the storage
+        self.tires = TireArray(self.loc, tire_forces, self.forces)
+
          # Force Points 
-        self.front_right = force_point(self,"front_right",self.loc.front_right, {"vertical_load":['z'], "x_friction":['x'], "y_friction":['y'], "rolling_resistance":['x']}, is_tire=True)
-        self.front_left =  force_point(self,"front_left",self.loc.front_left, {"vertical_load":['z'], "x_friction":['x'], "y_friction":['y'], "rolling_resistance":['x']}, is_tire=True)
-        self.rear_right =  force_point(self,"rear_right", self.loc.rear_right, {"vertical_load":['z'], "x_friction":['x'], "y_friction":['y'], "rolling_resistance":['x']}, is_tire=True)
-        self.rear_left = force_point(self,"rear_left", self.loc.rear_left, {"vertical_load":['z'], "x_friction":['x'], "y_friction":['y'], "rolling_resistance":['x']}, is_tire=True)
+        self.front_right = force_point(self,"front_right",self.loc.front_right, tire_forces, is_tire=True, forces=self.tires.view("front_right"))
+        self.front_left =  force_point(self,"front_left",self.loc.front_left, tire_forces, is_tire=True, forces=self.tires.view("front_left"))
+        self.rear_right =  force_point(self,"rear_right", self.loc.rear_right, tire_forces, is_tire=True, forces=self.tires.view("rear_right"))
+        self.rear_left = force_point(self,"rear_left", self.loc.rear_left, tire_forces, is_tire=True, forces=self.tires.view("rear_left"))
+
+        self.cnt_grav = force_point(self,"cnt_grav", self.loc.cog, cnt_grav_forces, forces=ArrayTimeSeriesView(self.forces, {force: f"cnt_grav_{force}" for force in cnt_grav_forces}, "cnt_grav"))
 
-        self.cnt_grav = force_point(self,"cnt_grav", self.loc.cog, {"inertial_z":['z'], "inertial_x":['x'], "inertial_y":['y']})
+        # The four tires, in the order used by the vectorized load calculations
+        self.tire_points = [self.front_right, self.front_left, self.rear_right, self.rear_left]
+
+        # Every force point as rows of (n_points, 3) arrays: their locations, and for each column of the force
+        # storage the (point, direction) slot it adds to, so the resultant is a couple of array operations
+        resultant_points = self.tire_points + [self.cnt_grav]
+        self._points_loc = np.array([point.loc for point in resultant_points], dtype=np.float64)
+        # Offsets of the points from the center of gravity, the default reference point of the torques
+        self._r_offsets = self._points_loc - np.asarray(self.loc.cog, dtype=np.float64)
+        self._resultant_cols = np.array([col for point in resultant_points for direction in ('x', 'y', 'z') for col in point._by_dir[direction]], dtype=np.intp)
+        self._resultant_slots = np.array([3*i + axis for i, point in enumerate(resultant_points) for axis, direction in enumerate(('x', 'y', 'z'))
+                                          for _ in point._by_dir[direction]], dtype=np.intp)
 
 
        
@@ -89,71 +267,32 @@ class Car:
         self.current_time+=self.timestep
         self.get_vertical_load()
 
-        initial_forces = {"x_friction":0, "y_friction":0, "rolling_resistance":0}
-        self.front_right.forces.update(initial_forces, self.current_time)
-        self.front_left.forces.update(initial_forces, self.current_time)
-        self.rear_right.forces.update(initial_forces, self.current_time)
-        self.rear_left.forces.update(initial_forces, self.current_time)
+        self.tires.update({"x_friction":np.zeros(4), "y_friction":np.zeros(4), "rolling_resistance":np.zeros(4)}, self.current_time)
         
         cnt_grav_initial = {"inertial_z":0, "inertial_x":0, "inertial_y":0}
         self.cnt_grav.forces.update(cnt_grav_initial, self.current_time)
 
         resultants = self.get_resultant_force_and_torque(self.current_time)
         
-        self.update_linear_motion(resultants['forces'])
-        self.update_rotational_motion(resultants['torques'])
-        logger.debug(f"After forces are applied; Position = {self.position} -- Velocity = {self.velocity} --")
+        self.update_motion(resultants['forces'], resultants['torques'])
+        logger.debug("After forces are applied; Position = %s -- Velocity = %s --", self.position, self.velocity)
         # Get combined dataframe 
 
     def get_vertical_load(self, time=None):
 
-        time = int(self.current_time) if time is None else time
-        # Lets get the basic parameters;
+        time = self.current_time if time is None else time
         # Time delta (adding a delta means that there is a lag between the force being applied at the wheel 
         # and it causing load transfer). 
         force_time = time- self.force_lag # Basically is the time that we will use for calculating forces. 
-        # ie, which force are we using (if its 0.05, it means that we want to look at the time 0.05 seconds beforehand, and from there determine what the forces were)
-
-        # Static Loads 
-        
-        front_tires = self.vehicle_weight*(self.dist_f/self.wheelbase)
-        rear_tires = self.vehicle_weight*(self.dist_r/self.wheelbase)
-        
 
-        # Okay so, I want this function to get the vertical load on each of the four tires at a 
-            # given point based on the current parameters.
-        # This involves the acceleration, velocity, and position of each point. 
+        # The load transfer follows from the car's acceleration at force_time, in closed form
+        accelerations = self.vehicle_details.row_values(force_time)
+        vertical_loads = np.empty(4)
+        vertical_load_kernel(accelerations[self._accel_cols[0]], accelerations[self._accel_cols[1]],
+                             self._static_loads, self._lt_long_coef, self._lt_lat_coef, vertical_loads)
 
-        # First Determine Longitudinal weight transfer
-        try:
-            rear_tire_force = self.rear_right.total_force('x', force_time) + self.rear_left.total_force('x', force_time)
-            front_tire_force = self.front_right.total_force('x', force_time) + self.front_left.total_force('x', force_time)
-        except Exception as e:
-            print(e)
-            __import__('pdb').set_trace()
-        # This load transfer is the "delta" of how much the load moves. 
-        load_transfer_accel = rear_tire_force*self.h_cog/self.wheelbase
-        load_transfer_brake = front_tire_force*self.h_cog/self.wheelbase
-        
-        # Now determine lateral weight transfer
-        left_tire_force = self.front_left.total_force('y', force_time) + self.rear_left.total_force('y', force_time)
-        right_tire_force = self.front_right.total_force('y', force_time) + self.rear_right.total_force('y', force_time)
-        
-        # This load transfer is the "delta" of how much the load moves. 
-        load_transfer_left = left_tire_force*self.h_cog/self.track_width    # This is the delta load to add to left tires (and subtract from right tires)
-        load_transfer_right = right_tire_force*self.h_cog/self.track_width  # This is the delta load to add to right tires (and subtract from left tires)
-
-        # Now getting the total per-tire
-        front_right = front_tires/2 - load_transfer_accel + load_transfer_brake + right_tire_force - left_tire_force
-        front_left = front_tires/2 - load_transfer_accel + load_transfer_brake - right_tire_force + left_tire_force
-        rear_right = rear_tires/2 + load_transfer_accel - load_transfer_brake + right_tire_force - left_tire_force
-        rear_left = rear_tires/2 + load_transfer_accel - load_transfer_brake - right_tire_force + left_tire_force
-        
         # Now we have the vertical load on each of the wheels
-        self.front_right.forces.update({"vertical_load":front_right}, time)
-        self.front_left.forces.update({"vertical_load":front_left}, time)
-        self.rear_right.forces.update({"vertical_load":rear_right}, time)
-        self.rear_left.forces.update({"vertical_load":rear_left}, time)
+        self.tires.update({"vertical_load":vertical_loads}, time)
 
     def calculate_timestep(self,time):
 
@@ -166,64 +305,43 @@ However, for the future this will be expanded to include the more complicated on
 
         """
 
-        logger.info(f"Calculating resultants at time : {time}")
+        logger.info("Calculating resultants at time : %s", time)
         
         for force_points in self.all_force_points:
-            try: 
-                if force_points.forces_incomplete(time):
-                    raise ValueError(f"Incomplete forces for force point {force_points.name}")
-                    return
-            except: 
-                import pdb; pdb.set_trace()
+            if force_points.forces_incomplete(time):
+                raise ValueError(f"Incomplete forces for force point {force_points.name}")
         resultants = self.get_resultant_force_and_torque(time)
         
-        self.update_linear_motion(resultants['forces'])
-        self.update_rotational_motion(resultants['torques'])
-        logger.debug(f"After forces are applied; Position = {self.position} -- Velocity = {self.velocity} --")
-        
-        self.update_master_dataframe(self.current_time)
-
-    # Linear motion updates
-    def update_linear_motion(self, forces):
-        # Calculate new acceleration
-        a_x = forces[0] / self.mass
-        a_y = forces[1] / self.mass
-        a_z = forces[2] / self.mass
-        self.acceleration = (a_x, a_y, a_z)
-        dt = self.timestep / 100
-        # Update velocity: v_new = v_old + a_new * dt
-        v_x = self.velocity[0] + a_x * dt
-        v_y = self.velocity[1] + a_y * dt
-        v_z = self.velocity[2] + a_z * dt
-        v_z = 0
-        self.velocity = (v_x, v_y, v_z)
-        
-        # Update position: p_new = p_old + v_new * dt + 0.5 * a_new * dt²
-        p_x = self.position[0] + v_x * dt + 0.5 * a_x * dt**2
-        p_y = self.position[1] + v_y * dt + 0.5 * a_y * dt**2
-        # p_z = self.position[2] + v_z * dt + 0.5 * a_z * dt**2
-        p_z = 0
-        self.position = (p_x, p_y, p_z)
+        self.update_motion(resultants['forces'], resultants['torques'])
+        logger.debug("After forces are applied; Position = %s -- Velocity = %s --", self.position, self.velocity)
+
+        # Only the last recorded step is tracked, the dataset is assembled from the storages when it is read
+        self.recorded_time = self.current_time
+
+    def update_motion(self, forces, torques):
+        """
+        Apply the resultant forces and torques of the current timestep to the car's motion.
+
+        Args:
+            forces: Resultant force (x, y, z) (N).
+            torques: Resultant torque (x, y, z) about the center of gravity (Nm).
+        """
+        self.yaw_velocity, self.yaw_angle = motion_kernel(
+            forces[0], forces[1], forces[2], torques[2], self.acceleration, self.velocity, self.position,
+            self.yaw_velocity, self.yaw_angle, self.mass, self.z_inertia, self._dt)
+        self.yaw_angle_wrapped = math.fmod(self.yaw_angle, 2*math.pi)
         # Keep in mind that velocity and position are updated for the next timestep, whereas acceleration is for the current timestep
             # Updating current timestep acceleration
-        self.vehicle_details.update({"acceleration":self.acceleration}, self.current_time)
+        self.vehicle_details.update({"acceleration_x": self.acceleration[0], "acceleration_y": self.acceleration[1], "acceleration_z": self.acceleration[2]}, self.current_time)
             # Updating next timesteps' velocity and position
-        self.vehicle_details.update({"velocity": self.velocity, "position": self.position}, self.current_time+self.timestep)
+        self.vehicle_details.update(self.motion_state(), self.current_time+self.timestep)
 
-    def update_rotational_motion(self, torques):
-        # Calculate angular acceleration: α = τ/I
-        torque_z = torques[2]
-        angular_acceleration = torque_z / self.z_inertia
-        
-        dt = self.timestep/100
-        # Update angular velocity: ω_new = ω_old + α * dt
-        self.yaw_velocity = self.yaw_velocity + angular_acceleration * dt
-        
-        # Update yaw angle: θ_new = θ_old + ω_new * dt + 0.5 * α * dt²
-        self.yaw_angle = self.yaw_angle + self.yaw_velocity * dt + 0.5 * angular_acceleration * dt**2
-        
-        # Optional: normalize angle to keep it between 0 and 360 degrees
-        self.yaw_angle = self.yaw_angle % 360
+    def motion_state(self):
+        """
+        The current velocity and position as vehicle_details columns.
+        """
+        return {"velocity_x": self.velocity[0], "velocity_y": self.velocity[1], "velocity_z": self.velocity[2],
+                "position_x": self.position[0], "position_y": self.position[1], "position_z": self.position[2]}
 
     def get_resultant_force_and_torque(self, time, reference_point=None):
 
@@ -240,51 +358,22 @@ However, for the future this will be expanded to include the more complicated on
                 - The resultant force in the x, y, and z directions.
                 - The resultant torque about the reference point in the x, y, and z directions.
         """
-        # Default reference point is the center of gravity
+        # Default reference point is the center of gravity, whose offsets are precomputed
         if reference_point is None:
-            reference_point = self.loc.cog
-
-        # Initialize the resultant force and torque components
-        resultant_force = [0, 0, 0]  # x, y, z
-        resultant_torque = [0, 0, 0]  # x, y, z
-
-        # List of all force points
-        force_points = [
-            self.front_right,
-            self.front_left,
-            self.rear_right,
-            self.rear_left,
-            self.cnt_grav
-        ]
-
-        # Sum up the forces and torques
-        for point in force_points:
-            # Get the force components
-            force_x = point.total_force('x', time)
-            force_y = point.total_force('y', time)
-            force_z = point.total_force('z', time)
-
-            # Add to the resultant force
-            resultant_force[0] += force_x
-            resultant_force[1] += force_y
-            resultant_force[2] += force_z
-
-            # Calculate the position vector from the reference point to the force point
-            r_x = point.loc[0] - reference_point[0]
-            r_y = point.loc[1] - reference_point[1]
-            r_z = point.loc[2] - reference_point[2]
-
-            # Calculate the torque contribution using the cross product: τ = r × F
-            torque_x = r_y * force_z - r_z * force_y
-            torque_y = r_z * force_x - r_x * force_z
-            torque_z = r_x * force_y - r_y * force_x
-
-            # Add to the resultant torque
-            resultant_torque[0] += torque_x
-            resultant_torque[1] += torque_y
-            resultant_torque[2] += torque_z
-        
-        logger.info(f"Timestep {time} had resultant forces of {resultant_force} And resultant torques of {resultant_torque}")
+            r = self._r_offsets
+        else:
+            r = self._points_loc - np.asarray(reference_point, dtype=np.float64)
+
+        # Forces of each point (n_points, 3), from one row of the force storage
+        row = self.forces.row_values(time)
+        point_forces = np.bincount(self._resultant_slots, weights=row[self._resultant_cols], minlength=self._points_loc.size).reshape(-1, 3)
+
+        # Sum up the forces, and the torques τ = r × F about the reference point
+        resultant_force = point_forces.sum(axis=0).tolist()
+        resultant_torque = np.cross(r, point_forces).sum(axis=0).tolist()
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Timestep %s had resultant forces of %s And resultant torques of %s", time, resultant_force, resultant_torque)
         return {'forces':tuple(resultant_force), 'torques':tuple(resultant_torque)}
 
     def accelerate_tires(self, 
@@ -301,32 +390,23 @@ However, for the future this will be expanded to include the more complicated on
                 # Lets go step by step for calculating a timestep. 
 
                 # First, the vertical load on the driven tires.
-                rr_vertical_load = self.rear_right.forces.get_value('vertical_load', self.current_time)
-                rl_vertical_load = self.rear_left.forces.get_value('vertical_load', self.current_time)
-                
-                # What if vertical load doesnt exist? WJKJ
+                # (one row read for the four tires, instead of a lookup per tire)
                 try:
-                    a = rr_vertical_load/2
-                    b = rl_vertical_load/2
-                except:
-                    import pdb; pdb.set_trace()
+                    vertical_loads = self.tires.force('vertical_load', self.current_time)
+                except KeyError as e:
+                    raise RuntimeError(f"No vertical loads at time {self.current_time}, get_vertical_load has to run first") from e
+                rr_vertical_load = vertical_loads[2]
+                rl_vertical_load = vertical_loads[3]
                 # Using this vertical load, we calculate the amount of longitudinal force the tire can provide. 
                 rear_right_force = self.rear_right.tire.allocate_forces(0,rr_vertical_load, self.velocity[0], longitudinal_mode, self.current_time)
                 rear_left_force = self.rear_left.tire.allocate_forces(0,rl_vertical_load, self.velocity[0], longitudinal_mode, self.current_time)
                 # Through this method, the force points themselves should be properly updated.
-                rear_right = {'x_friction':rear_right_force['Fx'], 'y_friction':rear_right_force['Fy'], "rolling_resistance":-100} 
-                rear_left= {'x_friction':rear_left_force['Fx'], 'y_friction':rear_left_force['Fy'], "rolling_resistance":-100} 
-                # import pdb; pdb.set_trace()
                 # I will fill the rest of the forces with 0 (to make sure it is at least included)
                 # THIS IS NOT HOW ROLLING RESISTANCE IS ACTUALLY CALCULATED!
-
-                null_forces = {"x_friction":0, "y_friction":0, "rolling_resistance":-100}
-                self.front_right.forces.update(null_forces, self.current_time)
-                self.front_left.forces.update(null_forces, self.current_time)
-
-                
-                self.rear_right.forces.update(rear_right, self.current_time)
-                self.rear_left.forces.update(rear_left, self.current_time)
+                # (front_right, front_left, rear_right, rear_left), one store per force
+                self.tires.update({"x_friction": [0, 0, rear_right_force['Fx'], rear_left_force['Fx']],
+                                   "y_friction": [0, 0, rear_right_force['Fy'], rear_left_force['Fy']],
+                                   "rolling_resistance": [-100, -100, -100, -100]}, self.current_time)
 
 
                 self.cnt_grav.forces.update({'inertial_z':0, 'inertial_x':0,  'inertial_y':0}, self.current_time)
@@ -340,23 +420,25 @@ However, for the future this will be expanded to include the more complicated on
                 # OKay im so close. just need to implement the right functions to the force point class and then figure out how to 
                 # ensure that the forces are actually passed on to the force object
 
-    def update_master_dataframe(self,time):
-        # This joins all the sub dataframes into the larger overall one.
-        update_list = []
-
-        # print("\n".join([i[0].data.to_string() for i in self.all_dataframes_for_update]))
-        try: 
-            for force_point, force_name in self.all_dataframes_for_update:
-                myvals = (force_point.get_time_series(time), force_name)
-                update_list.append(myvals)
-            self.full_dataset = append_new_rows(self.full_dataset, update_list, time)
-
-        except Exception as e:
-            print(e)
-            __import__('pdb').set_trace()
-            print("Failed to update master dataframe")
-        
-        logger.info(f"Master Dataframe has been updated for timestep {self.current_time}")
+    def dataset_arrays(self):
+        """
+        The vehicle details and all the forces up to the last recorded timestep, as a dictionary of column
+        arrays (views of the storages, starting with "time"). Both storages hold a row per step index.
+        """
+        n_rows = self.vehicle_details.row(self.recorded_time) + 1
+        vehicle = self.vehicle_details.array
+        forces = self.forces.array
+        columns = {"time": self.vehicle_details.times[:n_rows]}
+        columns.update({f"car_{col}": vehicle[:n_rows, i] for i, col in enumerate(self.vehicle_details.columns)})
+        columns.update({col: forces[:n_rows, self.forces.column_index(col)] for col in self.dataset_columns})
+        return columns
+
+    @property
+    def full_dataset(self):
+        """
+        The vehicle details and all the forces as one dataframe, up to the last recorded timestep.
+        """
+        return pd.DataFrame(self.dataset_arrays()).set_index("time")
 
     def export_dataset(self, export_name=None):
         import time
@@ -365,8 +447,8 @@ However, for the future this will be expanded to include the more complicated on
         
         export_path = f"data_export/{export_name}"
 
-        with open(export_path, 'w') as file:
-            self.full_dataset.to_csv(file)
+        # Written straight from the storage arrays, without building the full dataframe
+        write_csv(self.dataset_arrays(), export_path)
         
 
 class force_point:
@@ -376,37 +458,47 @@ class force_point:
                  name: str,
                  origin_location: tuple,
                  force_name_direction: dict,
-                 is_tire = False
+                 is_tire = False,
+                 forces = None
                  ):
         
         self.Car = Car
-        forces_at_point = {"time":[0]}
-        forces_at_point.update({name:[0] for name in force_name_direction.keys()})
         self.name = name
         self.loc = origin_location
         self.force_directions = force_name_direction
         self.is_tire = is_tire
-        # Create the Pandas DataFame
-        self.forces = TimeSeriesStorage(forces_at_point, name)
-        # self.old_forces = pd.DataFrame(forces_at_point,dtype=float) 
-        # self.old_forces.set_index("time", inplace=True)
-        
+        # The point's columns of a shared storage, or a preallocated storage of its own (one row per timestep)
+        if forces is None:
+            forces_at_point = {"time":[0]}
+            forces_at_point.update({force_name:[0] for force_name in force_name_direction.keys()})
+            forces = ArrayTimeSeriesStorage(forces_at_point, name, n_steps=Car.n_steps, timestep=Car.timestep)
+        self.forces = forces
+        # Columns of the forces acting in each direction, fixed once the point is created. They index the rows of
+        # the storage holding the array, so a view's columns are read without copying the view's row first.
+        self._source = self.forces.base_storage
+        self._by_dir = {direction: tuple(self.forces.column_index(force_name) for force_name, force_direction in force_name_direction.items()
+                                         if force_direction[0] == direction)
+                        for direction in ('x', 'y', 'z')}
+
         # Lets initialize the tire class, 
         if self.is_tire:
             self.make_tire()
 
+    @property
+    def forces_arr(self):
+        """
+        The forces of this point as an (n_steps, n_forces) array, columns in force_name_direction order.
+        """
+        return self.forces.array
+
     def total_force(self, direction, time):
-        # First need to define a way to track the direction of each force. 
-        # Then, just call f_t of a direction
-        try:
-            forces_in_direction = [force_name for force_name in self.force_directions.keys() if self.force_directions[force_name][0]==direction]
-        except Exception as e:
-            print(e)
-            import pbd; pdb.set_trace()
-        total_force = sum([self.forces.data.at[time,force] for force in forces_in_direction])
-        logger.debug(f"Returning total forces in {direction} direction for point {self.name}. Forces are : {forces_in_direction}. Sum was {total_force}")
-        
-        return total_force
+        # Sum of the forces of this point acting in the given direction ('x', 'y' or 'z') at the given time,
+        # added inline since a point only has one or two forces per direction
+        values = self._source.row_values(time)
+        total = 0.0
+        for i in self._by_dir[direction]:
+            total += values[i]
+        return float(total)
 
     def make_tire(self):
         if self.is_tire:
@@ -431,20 +523,247 @@ class force_point:
 
             # Get the resulting forces and moments
             forces = self.tire.get_forces()
-            logger.debug("Forces and Moments:", forces)
+            logger.debug("Forces and Moments: %s", forces)
 
             # Get the slip ratio and slip angle
             slip = self.tire.get_slip()
-            logger.debug("Slip Ratio and Angle:", slip)
+            logger.debug("Slip Ratio and Angle: %s", slip)
         else:
             pass
 
     def forces_incomplete(self, time):
         
-        time_row = self.forces.get_time_series(time)
-        if time_row is None:
-            return time_row
-        return time_row.hasnans
+        # Checked on the raw row values, without building a Series
+        try:
+            time_row = self.forces.row_values(time)
+        except KeyError:
+            return None
+        return bool(np.isnan(time_row).any())
+
+class TireArray:
+    """
+    The four tires of the car (front_right, front_left, rear_right, rear_left) as a structure of arrays.
+
+    The forces of all tires are kept in a block of a storage with a column per force and tire, grouped by force,
+    so that the values of the four tires at a timestep are contiguous and can be used as length-4 arrays.
+    """
+    names = ("front_right", "front_left", "rear_right", "rear_left")
+
+    @classmethod
+    def column_names(cls, force_name_direction: dict):
+        """
+        The storage columns of the tire forces, in the order the block is laid out.
+        """
+        return [f"{name}_{force}" for force in force_name_direction for name in cls.names]
+
+    def __init__(self, loc, force_name_direction: dict, forces: ArrayTimeSeriesStorage):
+        """
+        Args:
+            loc: The car's position object, with the contact point of each tire.
+            force_name_direction: Dictionary of the tire forces and their direction, as for a force_point.
+            forces: Storage holding the columns of `column_names` next to each other.
+        """
+        self.loc = loc.tire_xyz    # (4, 3)
+        self.force_names = list(force_name_direction.keys())
+        self._force_row = {force: i for i, force in enumerate(self.force_names)}
+        self.forces = forces
+        columns = self.column_names(force_name_direction)
+        start = forces._col[columns[0]]
+        if [forces._col[column] for column in columns] != list(range(start, start + len(columns))):
+            raise ValueError("The tire force columns must be contiguous and ordered as in TireArray.column_names")
+        self._block = slice(start, start + len(columns))
+
+        # Forces (rows of a timestep's (n_forces, 4) block) acting in each direction
+        self._by_dir = {direction: np.array([i for i, force in enumerate(self.force_names) if force_name_direction[force][0] == direction],
+                                            dtype=np.intp)
+                        for direction in ('x', 'y', 'z')}
+        # Projection of each force onto the x, y and z directions, (n_forces, 3)
+        self._direction_matrix = np.array([[force_name_direction[force][0] == direction for direction in ('x', 'y', 'z')]
+                                           for force in self.force_names], dtype=np.float64)
+
+        # Current state of each tire
+        self.Mz = np.zeros(4)       # Aligning moment (Nm)
+        self.delta = np.zeros(4)    # Steering angle (rad)
+
+        # Tire model evaluated for the four tires in one call
+        self.mf = MagicFormulaTireBatch(MagicFormulaTire("Racing Tire"), n_tires=len(self.names))
+
+    def step(self, time):
+        """
+        The forces of the four tires at the given time as an (n_forces, 4) array view.
+        """
+        return self.forces.row_values(time)[self._block].reshape(len(self.force_names), len(self.names))
+
+    def force(self, force_name, time):
+        """
+        One force of the four tires at the given time, as a length-4 array view.
+        """
+        return self.step(time)[self._force_row[force_name]]
+
+    def total_force(self, direction, time):
+        """
+        Sum of the forces acting in the given direction ('x', 'y' or 'z') on each tire, as a length-4 array.
+        """
+        total = np.empty(len(self.names))
+        row_sum_kernel(self.step(time), self._by_dir[direction], total)
+        return total
+
+    def total_force_xyz(self, time):
+        """
+        Sum of the forces acting in each direction on each tire, as a (4, 3) array (tires by x, y, z).
+        """
+        return self.step(time).T @ self._direction_matrix
+
+    def update(self, new_data: dict, time):
+        """
+        Update forces of all four tires at once.
+
+        Args:
+            new_data (dict): Force names mapped to a length-4 array with the value of each tire.
+            time: The time at which to update the forces.
+        """
+        row = self.forces.writable_row(time)
+        for force_name, values in new_data.items():
+            self.write_column(force_name, values, row=row)
+
+    def write_column(self, force_name, values, time=None, row=None):
+        """
+        Write one force of the four tires with a single array store.
+
+        Args:
+            force_name: Name of the force.
+            values: Length-4 values, one per tire.
+            time: The time at which to write the force (not needed if row is given).
+            row: The storage row to write into, from `forces.writable_row`.
+        """
+        row = self.forces.writable_row(time) if row is None else row
+        start = self._block.start + self._force_row[force_name]*len(self.names)
+        row[start:start + len(self.names)] = values
+
+    def to_body(self, time, reference_point=None, k_align=1.0):
+        """
+        Rotate the tire forces at the given time from each tire's frame (steered by delta) into the
+        body frame, and sum them for the four tires.
+
+        Args:
+            time: The time of the forces.
+            reference_point (tuple, optional): Point (x, y, z) about which the yaw moment is taken.
+                                               Defaults to the origin of the car's coordinate system.
+            k_align: Factor applied to the tires' aligning moments Mz.
+
+        Returns:
+            tuple: (Fx_total, Fy_total, Mz_total), the resultant body forces (N) and yaw moment (Nm).
+        """
+        forces = self.total_force_xyz(time)
+        fx = np.ascontiguousarray(forces[:, 0])
+        fy = np.ascontiguousarray(forces[:, 1])
+        r = self.loc if reference_point is None else self.loc - np.asarray(reference_point, dtype=np.float64)
+        return body_force_kernel(fx, fy, self.Mz, self.delta, r, float(k_align))
+
+    def steady_state_forces(self, time, kappa, alpha, gamma=0.0):
+        """
+        Magic Formula forces of the four tires under their vertical loads at the given time.
+
+        Args:
+            time: The time of the vertical loads.
+            kappa, alpha, gamma: Slip ratios, slip angles (rad) and camber angles (rad) of the tires,
+                                 length-4 arrays (or (4, N_p) to evaluate N_p scenarios).
+
+        Returns:
+            (Fx, Fy, Mx, My, Mz) arrays.
+        """
+        Fz = self.force("vertical_load", time)
+        if np.ndim(kappa) == 2 or np.ndim(alpha) == 2:
+            Fz = Fz[:, None]
+        return self.mf.compute(Fz, kappa, alpha, gamma)
+
+    def view(self, name):
+        """
+        The forces of one tire, as a storage of their own (used by that tire's force_point).
+        """
+        return ArrayTimeSeriesView(self.forces, {force: f"{name}_{force}" for force in self.force_names}, name)
+
+
+class CarSweep:
+    """
+    N_p car designs (e.g. a sweep of mass or center of gravity height) simulated side by side in a straight line.
+
+    Every parameter is a length-N_p array (scalars are broadcast), and the per-tire quantities are (4, N_p)
+    arrays with the tires in TireArray order, so each timestep advances all the designs with the same few
+    array operations instead of a Car per design.
+    """
+
+    def __init__(self, mass, dist_f, dist_r, h_cog, track_width, timestep=5):
+        """
+        Args:
+            mass: Total mass of each design (kg).
+            dist_f, dist_r: x distance from the front and rear axle to the center of gravity (m).
+            h_cog: Height of the center of gravity (m).
+            track_width: Track width (m).
+            timestep: Timestep, in the same units as Car.timestep.
+        """
+        # Copied out of the read-only broadcast views, so the kernels get plain contiguous arrays
+        params = [np.array(param) for param in np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(param, dtype=np.float64)) for param in (mass, dist_f, dist_r, h_cog, track_width)])]
+        self.mass, self.dist_f, self.dist_r, self.h_cog, self.track_width = params
+        self.n_designs = self.mass.shape[0]
+        self.vehicle_weight = self.mass*9.81
+        self.wheelbase = self.dist_f+self.dist_r
+        self.timestep = timestep
+        self.current_time = 0
+
+        # Static loads (4, N_p) and load transfer coefficients (N_p) of each design
+        front_half = 0.5*self.vehicle_weight*self.dist_r/self.wheelbase
+        rear_half = 0.5*self.vehicle_weight*self.dist_f/self.wheelbase
+        self._static_loads = np.stack([front_half, front_half, rear_half, rear_half])
+        self._lt_long_coef = 0.5*self.mass*self.h_cog/self.wheelbase
+        self._lt_lat_coef = 0.5*self.mass*self.h_cog/self.track_width
+
+        # Tire model evaluated for the four tires of every design in one call
+        self.mf = MagicFormulaTireBatch(MagicFormulaTire("Racing Tire"), n_tires=len(TireArray.names))
+
+        # Transient state, (3, N_p) for x, y, z and (4, N_p) tire forces from the previous step
+        self.acceleration = np.zeros((3, self.n_designs))
+        self.velocity = np.zeros((3, self.n_designs))
+        self.position = np.zeros((3, self.n_designs))
+        self.fx = np.zeros((4, self.n_designs))
+        self.fy = np.zeros((4, self.n_designs))
+
+    def vertical_loads(self, a_x=None, a_y=None):
+        """
+        Vertical load on the tires of every design, as a (4, N_p) array.
+
+        Args:
+            a_x, a_y: Length-N_p accelerations causing the load transfer. Default to the previous step's,
+                      i.e. a lag of one timestep like Car.force_lag.
+        """
+        a_x = self.acceleration[0] if a_x is None else np.broadcast_to(a_x, self.mass.shape).astype(np.float64)
+        a_y = self.acceleration[1] if a_y is None else np.broadcast_to(a_y, self.mass.shape).astype(np.float64)
+        vertical_loads = np.empty_like(self._static_loads)
+        vertical_load_kernel(a_x, a_y, self._static_loads, self._lt_long_coef, self._lt_lat_coef, vertical_loads)
+        return vertical_loads
+
+    def step(self, kappa, alpha=0.0, gamma=0.0):
+        """
+        Advance all designs by one timestep with the given tire slips.
+
+        Args:
+            kappa, alpha, gamma: Slip ratios, slip angles (rad) and camber angles (rad), anything that
+                                 broadcasts to (4, N_p) (e.g. [0, 0, 0.1, 0.1] as a column for a RWD launch).
+
+        Returns:
+            (4, N_p) array of the vertical loads used for the step.
+        """
+        Fz = self.vertical_loads()
+        tire_forces = self.mf.compute(Fz, kappa, alpha, gamma)
+        self.fx = np.ascontiguousarray(tire_forces[0])
+        self.fy = np.ascontiguousarray(tire_forces[1])
+
+        # Integrate the motion of the designs in parallel
+        sweep_motion_kernel(self.fx, self.fy, self.acceleration, self.velocity, self.position, self.mass, self.timestep / 100)
+        self.current_time += self.timestep
+        return Fz
+
 
 class position:
 
@@ -458,10 +777,28 @@ class position:
         # Coordinate system has origin at the center point between the rear wheel 
         # contact patch. ie, on the ground between the rear tires
         wheelbase = dist_f+dist_r
-        self.front_right = (track_width/2, wheelbase, 0)
-        self.front_left = (-track_width/2, wheelbase, 0)
-        self.rear_right = (track_width/2, 0, 0)
-        self.rear_left = (-track_width/2, 0, 0)
+        # Contact points of the four tires (front_right, front_left, rear_right, rear_left) as one (4, 3) array
+        self.tire_xyz = np.array([[track_width/2, wheelbase, 0],
+                                  [-track_width/2, wheelbase, 0],
+                                  [track_width/2, 0, 0],
+                                  [-track_width/2, 0, 0]], dtype=np.float64)
         self.cog = (dist_r, 0, h_cog)
 
+    # Each tire's contact point as an (x, y, z) tuple
+    @property
+    def front_right(self):
+        return tuple(self.tire_xyz[0])
+
+    @property
+    def front_left(self):
+        return tuple(self.tire_xyz[1])
+
+    @property
+    def rear_right(self):
+        return tuple(self.tire_xyz[2])
+
+    @property
+    def rear_left(self):
+        return tuple(self.tire_xyz[3])
+
 
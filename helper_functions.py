@@ -1,39 +1,126 @@
 #helper_functions.py 
 # This is meant to declutter the main scripts from less necessary scripts 
+import os
+import numpy as np
 import pandas as pd
 from logger import setup_logger
 
 logger = setup_logger()
 
+# Keep numba's compiled kernels in one place next to the sources, so later runs only load them
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__", "numba"))
+
+# Options shared by the jitted lap/track kernels. fastmath may change results in the last bits and
+# error_model="numpy" makes a division by zero give inf/nan instead of raising.
+NJIT_OPTIONS = dict(cache=True, fastmath=True, boundscheck=False, error_model="numpy")
+
+# Options for the kernels of car.py. These only cache and keep numba's defaults otherwise, so the car
+# simulation output stays bit for bit the same as the pure Python version.
+CAR_NJIT_OPTIONS = dict(cache=True)
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # Numba is optional; without it the jitted kernels just run as plain Python.
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    # PyArrow is optional; without it datasets are written to CSV through pandas.
+    pa = None
 
-import pandas as pd
 
 class TimeSeriesStorage:
-    def __init__(self, initial_data: dict, name: str, col_types=None):
+    def __init__(self, initial_data: dict, name: str, col_types=None, expected_steps: int = 1024, timestep=None):
         """
         Initialize the TimeSeriesStorage with initial data.
 
+        Each column is kept in a preallocated NumPy array (float64 for numeric columns, object otherwise)
+        with one row per stored time, and the DataFrame is only built when `data` is read.
+
         Args:
             initial_data (dict): A dictionary where keys are column names and values are lists of initial values.
             name (str): Name of the TimeSeriesStorage instance.
             col_types (dict, optional): A dictionary where keys are column names and values are the desired dtypes.
-                                       If None, no explicit dtype assignment is performed.
+                                       If None, the dtypes are inferred from the initial values.
+            expected_steps (int, optional): Number of rows to preallocate, the buffers double when they are full.
+            timestep (int, optional): If given, times are the multiples of the timestep starting at 0, and the row
+                                      of a time is its step index (time / timestep) instead of a dictionary lookup.
         """
         self.name = name
-        self.data = pd.DataFrame(initial_data)
-
-        # Ensure 'time' column is of type int and set it as the index
-        self.data['time'] = self.data['time'].astype(int)
-        self.data.set_index("time", inplace=True)
+        self.columns = [col for col in initial_data.keys() if col != "time"]
+        self._timestep = timestep
 
         # Apply column dtypes if col_types is provided
+        dtypes = {col: (np.float64 if np.asarray(initial_data[col]).dtype.kind in "biuf" else object) for col in self.columns}
         if col_types is not None:
             for col, dtype in col_types.items():
-                if col in self.data.columns:
-                    self.data[col] = self.data[col].astype(dtype)
+                if col in dtypes:
+                    dtypes[col] = object if dtype in ('object', object) else np.dtype(dtype)
                 else:
                     raise ValueError(f"Column '{col}' specified in col_types does not exist in the DataFrame.")
 
+        # The columns are fixed, so the check of the updated columns is a single subset test
+        self._valid_columns = frozenset(self.columns)
+
+        # Row of each stored time, and the next row to write
+        self._row_of_time = {}
+        self._write_idx = 0
+        times = initial_data["time"]
+        n_rows = max(expected_steps, len(times))
+        self._time = np.zeros(n_rows, dtype=np.int64)
+        # Rows that were never written stay NaN, like the missing values of a DataFrame row
+        self._cols = {col: np.full(n_rows, np.nan, dtype=dtypes[col]) for col in self.columns}
+        # DataFrame of the rows, built when data is read and dropped on the next update
+        self._data = None
+
+        for i, time in enumerate(times):
+            row = self._add_row(int(time))
+            for col in self.columns:
+                self._cols[col][row] = initial_data[col][i]
+
+    def step_index(self, time: int):
+        """
+        Step index of a time, i.e. its row when the storage has a fixed timestep.
+        """
+        return int(round(time / self._timestep))
+
+    def _find_row(self, time: int):
+        """
+        Row holding the given time, or None if there is none.
+        """
+        if self._timestep is None:
+            return self._row_of_time.get(time)
+        row = self.step_index(time)
+        return row if 0 <= row < self._write_idx else None
+
+    def _add_row(self, time: int):
+        """
+        Add a row for the given time, doubling the buffers if they are full.
+        With a fixed timestep, the rows of the steps skipped before it are added too (left empty).
+        """
+        row = self._write_idx if self._timestep is None else self.step_index(time)
+        if row < 0:
+            raise ValueError(f"Time {time} is before the start of the storage.")
+        while row >= self._time.shape[0]:
+            self._time = np.concatenate([self._time, np.zeros_like(self._time)])
+            self._cols = {col: np.concatenate([values, np.full_like(values, np.nan)]) for col, values in self._cols.items()}
+        if self._timestep is None:
+            self._time[row] = time
+            self._row_of_time[time] = row
+        else:
+            self._time[self._write_idx:row+1] = np.arange(self._write_idx, row+1) * self._timestep
+        # An earlier step only fills its row, the rows written after it are kept
+        self._write_idx = max(self._write_idx, row + 1)
+        return row
+
     def update(self, new_data: dict, time: int):
         """
         Update the time-series data at a specific time.
@@ -45,37 +132,27 @@ class TimeSeriesStorage:
         Raises:
             ValueError: If new_data contains columns not present in the DataFrame.
         """
-        try:
-            # Log the start of the update process
-            logger.info(f"Starting data update for {self.name}:{new_data} at time {time}")
-            
-            # Check if all columns in new_data exist in the DataFrame
-            if not all(col in self.data.columns for col in new_data.keys()):
-                raise ValueError("New data contains columns not present in the DataFrame")
-            
-            # Check if time exists in the index
-            if time in self.data.index:
-                # logger.debug("Updating existing row at time %s", time)
-                # Update existing row
-                for col, value in new_data.items():
-                    if type(value) == tuple:
-                        # import pdb; pdb.set_trace()
-                        self.data.at[time, col] = value
-                    else:
-                        self.data.at[time, col] = value
-            else:
-                # logger.debug("Appending new row at time %s", time)
-                # Append new row
-                self.data.loc[time] = new_data
-            
-            # Log successful update
-            # logger.info("Successfully updated data at time %s", time)
-            
-        except Exception as e:
-            # Log the error
-            logger.error(f"Error updating data at time {time}: {str(e)}")
-            # Re-raise the exception if you want the caller to handle it
-            raise
+        # Log the start of the update process
+        logger.debug("Starting data update for %s:%s at time %s", self.name, new_data, time)
+
+        # Check if all columns in new_data exist in the DataFrame
+        if not new_data.keys() <= self._valid_columns:
+            logger.error("Error updating data at time %s: New data contains columns not present in the DataFrame", time)
+            raise ValueError("New data contains columns not present in the DataFrame")
+
+        # Update the existing row, or append a new one
+        row = self._find_row(time)
+        if row is None:
+            row = self._add_row(time)
+        for col, value in new_data.items():
+            self._cols[col][row] = value
+        self._data = None
+
+    def has_time(self, time: int):
+        """
+        Whether a row is stored for the given time.
+        """
+        return self._find_row(time) is not None
 
     def get_value(self, column: str, time: int):
         """
@@ -88,28 +165,38 @@ class TimeSeriesStorage:
         Returns:
             The value at the specified time and column, or None if not found.
         """
-        try:
-            return self.data.at[time, column]
-        except KeyError:
-            logger.warning(f"Error: Time index '{time}' or column '{column}' not found.")
+        row = self._find_row(time)
+        if row is None or column not in self._cols:
+            logger.warning("Error: Time index '%s' or column '%s' not found.", time, column)
             return None
+        return self._cols[column][row]
 
     def get_time_series(self, time: int):
         """
         Retrieve a specific row as a Pandas Series.
 
         Args:
-            column (str): The column name to retrieve.
+            time (int): The time of the row to retrieve.
 
         Returns:
-            A Pandas Series representing the specified column.
+            A Pandas Series with the values of each column at that time, or None if there is no such row.
         """
-        try:
-            return self.data.loc[time]
-        except Exception as e:
-            print(e)
-            import pdb; pdb.set_trace()
+        row = self._find_row(time)
+        if row is None:
+            logger.warning("Error: Time index '%s' not found.", time)
             return None
+        return pd.Series([self._cols[col][row] for col in self.columns], index=self.columns, name=time)
+
+    @property
+    def data(self):
+        """
+        The stored rows as a DataFrame indexed by time, built on the first access after an update.
+        """
+        if self._data is None:
+            n = self._write_idx
+            self._data = pd.DataFrame({col: pd.Series(values[:n], dtype=values.dtype, copy=True) for col, values in self._cols.items()},
+                                      columns=self.columns).set_axis(pd.Index(self._time[:n], name="time"))
+        return self._data
 
     def get_dataframe(self):
         """
@@ -120,6 +207,266 @@ class TimeSeriesStorage:
         """
         return self.data
     
+class ArrayTimeSeriesStorage(TimeSeriesStorage):
+    def __init__(self, initial_data: dict, name: str, n_steps: int = 1024, timestep: int = None):
+        """
+        TimeSeriesStorage for numeric data, backed by a preallocated float64 array instead of a DataFrame.
+        Adding a row is a single array store (the buffer doubles when full), and the DataFrame is only
+        built when `data` is read, e.g. for reporting.
+
+        Args:
+            initial_data (dict): A dictionary where keys are column names and values are lists of initial values.
+                                 Must contain a 'time' column.
+            name (str): Name of the ArrayTimeSeriesStorage instance.
+            n_steps (int, optional): Number of rows to preallocate.
+            timestep (int, optional): If given, times are the multiples of the timestep starting at 0, and the row
+                                      of a time is its step index (time / timestep) instead of a dictionary lookup.
+        """
+        self.name = name
+        self.columns = [col for col in initial_data.keys() if col != "time"]
+        self._col = {col: i for i, col in enumerate(self.columns)}
+        self._valid_columns = frozenset(self.columns)
+        self._timestep = timestep
+        self._row_of_time = {}
+        self._n_rows = 0
+
+        # Rows that were never written stay NaN, like the missing values of a DataFrame row
+        times = initial_data["time"]
+        self._arr = np.full((max(n_steps, len(times)), len(self.columns)), np.nan)
+        self._times = np.zeros(self._arr.shape[0], dtype=np.int64)
+        for i, time in enumerate(times):
+            row = self._add_row(int(time))
+            for col in self.columns:
+                self._arr[row, self._col[col]] = initial_data[col][i]
+
+    def _find_row(self, time: int):
+        """
+        Row holding the given time, or None if there is none.
+        """
+        if self._timestep is None:
+            return self._row_of_time.get(time)
+        row = self.step_index(time)
+        return row if 0 <= row < self._n_rows else None
+
+    def _add_row(self, time: int):
+        """
+        Add the row for the given time, growing the buffer if it is full.
+        With a fixed timestep, the rows of the steps skipped before it are added too (left empty).
+        """
+        row = self._n_rows if self._timestep is None else self.step_index(time)
+        if row < 0:
+            raise ValueError(f"Time {time} is before the start of the storage.")
+        while row >= self._arr.shape[0]:
+            self._arr = np.concatenate([self._arr, np.full_like(self._arr, np.nan)])
+            self._times = np.concatenate([self._times, np.zeros_like(self._times)])
+        if self._timestep is None:
+            self._row_of_time[time] = row
+            self._times[row] = time
+        else:
+            self._times[self._n_rows:row+1] = np.arange(self._n_rows, row+1) * self._timestep
+        # An earlier step only fills its row, the rows written after it are kept
+        self._n_rows = max(self._n_rows, row + 1)
+        return row
+
+    def update(self, new_data: dict, time: int):
+        """
+        Update the time-series data at a specific time, adding the row if needed.
+
+        Args:
+            new_data (dict): A dictionary where keys are column names and values are the new values to be updated.
+            time (int): The time at which to update the data.
+
+        Raises:
+            ValueError: If new_data contains columns not present in the storage.
+        """
+        logger.debug("Starting data update for %s:%s at time %s", self.name, new_data, time)
+
+        if not new_data.keys() <= self._valid_columns:
+            logger.error("Error updating data at time %s: New data contains columns not present in the DataFrame", time)
+            raise ValueError("New data contains columns not present in the DataFrame")
+
+        row = self._find_row(time)
+        if row is None:
+            row = self._add_row(time)
+        # Write the whole row in a single store
+        cols = [self._col[col] for col in new_data]
+        self._arr[row, cols] = list(new_data.values())
+
+    def writable_row(self, time: int):
+        """
+        The row of the given time as an array view to write into, adding the row if needed.
+        """
+        row = self._find_row(time)
+        if row is None:
+            row = self._add_row(time)
+        return self._arr[row]
+
+    def row(self, time: int):
+        """
+        Row of the array holding the given time. Raises KeyError if there is none.
+        """
+        row = self._find_row(time)
+        if row is None:
+            raise KeyError(time)
+        return row
+
+    def row_values(self, time: int):
+        """
+        The values stored at the given time, in the order of `columns`. Raises KeyError if there is no such row.
+        """
+        return self._arr[self.row(time)]
+
+    @property
+    def base_storage(self):
+        """
+        The storage holding the array, i.e. this one.
+        """
+        return self
+
+    def column_index(self, column: str):
+        """
+        Index of a column in the rows of `base_storage`.
+        """
+        return self._col[column]
+
+    @property
+    def times(self):
+        """
+        The time of each stored row.
+        """
+        return self._times[:self._n_rows]
+
+    @property
+    def array(self):
+        """
+        The stored rows as an (n_rows, n_columns) array view, in the order of `columns`.
+        """
+        return self._arr[:self._n_rows]
+
+    def get_value(self, column: str, time: int):
+        """
+        Retrieve a specific value from the time-series data.
+
+        Args:
+            column (str): The column name from which to retrieve the value.
+            time (int): The time at which to retrieve the value.
+
+        Returns:
+            The value at the specified time and column, or None if not found.
+        """
+        row = self._find_row(time)
+        if row is None or column not in self._col:
+            logger.warning("Error: Time index '%s' or column '%s' not found.", time, column)
+            return None
+        return self._arr[row, self._col[column]]
+
+    def get_time_series(self, time: int):
+        """
+        Retrieve the row at a specific time as a Pandas Series, or None if there is no such row.
+        """
+        row = self._find_row(time)
+        if row is None:
+            logger.warning("Error: Time index '%s' not found.", time)
+            return None
+        return pd.Series(self._arr[row].copy(), index=self.columns, name=time)
+
+    @property
+    def data(self):
+        """
+        The stored rows as a DataFrame indexed by time.
+        """
+        return pd.DataFrame(self.array.copy(), index=pd.Index(self.times.copy(), name="time"), columns=self.columns)
+
+
+class ArrayTimeSeriesView(TimeSeriesStorage):
+    def __init__(self, storage: ArrayTimeSeriesStorage, columns: dict, name: str):
+        """
+        A subset of the columns of an ArrayTimeSeriesStorage, renamed, that behaves like a storage of its own.
+        Used to share one array between several objects, each of them reading and writing its own columns.
+
+        Args:
+            storage (ArrayTimeSeriesStorage): The storage holding the data.
+            columns (dict): A dictionary mapping the column names of the view to column names of the storage.
+            name (str): Name of the view.
+        """
+        self.name = name
+        self.storage = storage
+        self.columns = list(columns.keys())
+        self._storage_col = dict(columns)
+        self._valid_columns = frozenset(self.columns)
+        self._cols = np.array([storage._col[col] for col in columns.values()], dtype=np.intp)
+
+    def update(self, new_data: dict, time: int):
+        """
+        Update the columns of the view at a specific time, adding the row to the storage if needed.
+
+        Raises:
+            ValueError: If new_data contains columns not present in the view.
+        """
+        if not new_data.keys() <= self._valid_columns:
+            logger.error("Error updating data at time %s: New data contains columns not present in the DataFrame", time)
+            raise ValueError("New data contains columns not present in the DataFrame")
+        self.storage.update({self._storage_col[col]: value for col, value in new_data.items()}, time)
+
+    def row(self, time: int):
+        """
+        Row of the storage holding the given time. Raises KeyError if there is none.
+        """
+        return self.storage.row(time)
+
+    def row_values(self, time: int):
+        """
+        The values of the view at the given time, in the order of `columns`. Raises KeyError if there is no such row.
+        """
+        return self.storage.row_values(time)[self._cols]
+
+    @property
+    def base_storage(self):
+        """
+        The storage holding the array the view reads from.
+        """
+        return self.storage
+
+    def column_index(self, column: str):
+        """
+        Index of a column of the view in the rows of `base_storage`.
+        """
+        return self.storage._col[self._storage_col[column]]
+
+    @property
+    def array(self):
+        """
+        The stored rows of the view's columns, as an (n_rows, n_columns) array (a copy).
+        """
+        return self.storage.array[:, self._cols]
+
+    def get_value(self, column: str, time: int):
+        """
+        Retrieve a specific value from the time-series data, or None if not found.
+        """
+        if column not in self._storage_col:
+            logger.warning("Error: Time index '%s' or column '%s' not found.", time, column)
+            return None
+        return self.storage.get_value(self._storage_col[column], time)
+
+    def get_time_series(self, time: int):
+        """
+        Retrieve the row at a specific time as a Pandas Series, or None if there is no such row.
+        """
+        try:
+            return pd.Series(self.row_values(time), index=self.columns, name=time)
+        except KeyError:
+            logger.warning("Error: Time index '%s' not found.", time)
+            return None
+
+    @property
+    def data(self):
+        """
+        The stored rows of the view as a DataFrame indexed by time.
+        """
+        return pd.DataFrame(self.array, index=pd.Index(self.storage.times.copy(), name="time"), columns=self.columns)
+
+
 def combine_dataframes(
     list_of_named_dfs: list[tuple[pd.DataFrame, str]],
     time_index: str = "time",
@@ -139,36 +486,41 @@ def combine_dataframes(
         DataFrame's name.
     """
     
-    if all([isinstance(named_df[0], TimeSeriesStorage) for named_df in list_of_named_dfs]):
+    if all(isinstance(named_df[0], TimeSeriesStorage) for named_df in list_of_named_dfs):
         list_of_named_dfs = [(named_df[0].data, named_df[1]) for named_df in list_of_named_dfs]
         logger.debug("All objects to combine were TimeSeries")
-    elif all([isinstance(named_df[0], pd.DataFrame) for named_df in list_of_named_dfs]):
+    elif all(isinstance(named_df[0], pd.DataFrame) for named_df in list_of_named_dfs):
         logger.debug("All objects to combine were Dataframes")
     else:
-        logger.warn(f"Not all objects had the same type, or were not dataframes or Time Series. Recieved; {[(type(named_df[0]), named_df[1]) for named_df in list_of_named_dfs]}")
+        logger.warning("Not all objects had the same type, or were not dataframes or Time Series. Recieved; %s",
+                       [(type(named_df[0]), named_df[1]) for named_df in list_of_named_dfs])
         return pd.DataFrame()
 
     if not list_of_named_dfs:
         return pd.DataFrame()
 
+    # The names prefix the columns, so a repeated name would make sources overwrite each other
+    names = [name for _, name in list_of_named_dfs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Dataframe names must be unique to combine them, got {names}")
+
     # Set time index for all dataframes
-    # import pdb; pdb.set_trace()
     # for df, _ in list_of_named_dfs:
     #     if time_index not in df.columns:
-    # import pdb; pdb.set_trace()
     #
     #         df[time_index] = range(len(df))  # Create a new index column
     #     df.set_index(time_index, inplace=True)
 
-    # Rename columns to include dataframe name
-    renamed_dfs = []
-    for df, name in list_of_named_dfs:
-        renamed_df = df.copy()
-        renamed_df.columns = [f"{name}_{col}" for col in df.columns]
-        renamed_dfs.append(renamed_df)
-
-    # Concatenate all dataframes
-    combined_df = pd.concat(renamed_dfs, axis=1)
+    index = list_of_named_dfs[0][0].index
+    if all(df.index.equals(index) for df, _ in list_of_named_dfs):
+        # Same time index everywhere, so build the frame once from the renamed column arrays (pandas copies
+        # them into the new frame, but no intermediate frames are made)
+        combined_df = pd.DataFrame({f"{name}_{col}": df[col].to_numpy(copy=False) for df, name in list_of_named_dfs for col in df.columns},
+                                   index=index)
+    else:
+        # Concatenate all dataframes under their names, aligning the time indexes, then flatten the (name, column) labels
+        combined_df = pd.concat({name: df for df, name in list_of_named_dfs}, axis=1)
+        combined_df.columns = [f"{name}_{col}" for name, col in combined_df.columns]
 
 
     # Reset index
@@ -176,51 +528,22 @@ def combine_dataframes(
 
     return combined_df
 
-def append_new_rows(
-    combined_df: pd.DataFrame,
-    new_rows: list[tuple[pd.Series, str]],
-    time: int,
-) -> pd.DataFrame:
-    """Appends new rows to the combined DataFrame efficiently.
-
-    Args:
-        combined_df: The existing combined DataFrame.
-        new_rows: A list of tuples, where each tuple contains a Pandas Series
-            representing the new row for a source DataFrame, and the name
-            of the source DataFrame.  The index of the series should match
-            the column names of the original dataframe
-        time_index: The name of the time index column.  Defaults to "time".
 
-    Returns:
-        The updated combined DataFrame with the new rows appended.
+def write_csv(columns: dict, file_path: str):
     """
+    Write named columns to a CSV file. With PyArrow the arrays are wrapped in an Arrow table
+    (no copy for numeric arrays) and written by its CSV writer, otherwise through a DataFrame.
 
-    new_row_data = {"time":time}
-    time_value = None  # Store the time value from the first new row
-
-    # Extract data from new rows and store in a dictionary
-
-    # import pdb; pdb.set_trace()
-    for row, name in new_rows:
-        if time_value is None:
-            time_value = row.index  # Get time value from first row
-        for col, value in row.items():
-            new_row_data[f"{name}_{col}"] = value
-
-    # Add the time index to the new row data
-    # new_row_data[time_index] = time_value
-
-    # Create a new DataFrame from the collected data
-    if False:
-        new_row_df = pd.DataFrame([new_row_data], index=[time])
-        new_row_df.index.name = 'time'
-        # Append the new row to the combined DataFrame
-        combined_df = pd.concat([combined_df, new_row_df], ignore_index=False)
-    
-    # Series Method
-    new_row_series = pd.Series(new_row_data, name=time)
-
-    combined_df.loc[time] = new_row_series
-
-    return combined_df
-
+    Args:
+        columns (dict): Column names mapped to 1-d arrays of equal length, in the order they are written.
+        file_path (str): Path of the CSV file.
+    """
+    if pa is not None:
+        # NaN values are written as empty fields, like pandas does
+        table = pa.table({name: pa.array(values, from_pandas=True) for name, values in columns.items()})
+        with open(file_path, 'wb') as file:
+            # Header written unquoted, as pandas writes it, then the rows streamed by Arrow's writer
+            file.write((",".join(table.column_names) + "\n").encode())
+            pa_csv.write_csv(table, file, pa_csv.WriteOptions(include_header=False))
+    else:
+        pd.DataFrame(columns).to_csv(file_path, index=False)
@@ -0,0 +1,83 @@
+# helper_functions_testing.py
+import unittest
+import numpy as np
+from helper_functions import TimeSeriesStorage, ArrayTimeSeriesStorage
+
+
+class TestTimeSeriesStorage(unittest.TestCase):
+    def make_storage(self, initial_data=None, timestep=None, steps=4):
+        if initial_data is None:
+            initial_data = {"time": [], "Fx": []}
+        return TimeSeriesStorage(initial_data, "test", expected_steps=steps, timestep=timestep)
+
+    def buffer_size(self, storage):
+        return storage._time.shape[0]
+
+    def test_rows_by_time(self):
+        storage = self.make_storage()
+        storage.update({"Fx": 1.0}, 3)
+        storage.update({"Fx": 2.0}, 7)
+        storage.update({"Fx": 5.0}, 3)  # Updates the existing row
+        self.assertEqual(storage.data.index.tolist(), [3, 7])
+        self.assertEqual(storage.data["Fx"].tolist(), [5.0, 2.0])
+        self.assertTrue(storage.has_time(7))
+        self.assertFalse(storage.has_time(5))
+
+    def test_step_index_rows(self):
+        storage = self.make_storage(timestep=5)
+        self.assertEqual(storage.step_index(0), 0)
+        self.assertEqual(storage.step_index(15), 3)
+        storage.update({"Fx": 1.0}, 0)
+        storage.update({"Fx": 2.0}, 5)
+        self.assertEqual(storage.data.index.tolist(), [0, 5])
+        self.assertEqual(storage.get_value("Fx", 5), 2.0)
+
+    def test_skipped_steps_are_nan(self):
+        storage = self.make_storage(timestep=5)
+        storage.update({"Fx": 1.0}, 0)
+        storage.update({"Fx": 4.0}, 15)
+        data = storage.data
+        self.assertEqual(data.index.tolist(), [0, 5, 10, 15])
+        self.assertEqual(data["Fx"].iloc[0], 1.0)
+        self.assertTrue(np.isnan(data["Fx"].iloc[1]))
+        self.assertTrue(np.isnan(data["Fx"].iloc[2]))
+        self.assertEqual(data["Fx"].iloc[3], 4.0)
+        self.assertFalse(storage.has_time(20))
+
+    def test_buffer_doubling(self):
+        storage = self.make_storage(timestep=1, steps=4)
+        for time in range(10):
+            storage.update({"Fx": float(time)}, time)
+        self.assertGreaterEqual(self.buffer_size(storage), 10)
+        self.assertEqual(storage.data["Fx"].tolist(), [float(time) for time in range(10)])
+
+    def test_negative_time(self):
+        storage = self.make_storage(timestep=5)
+        with self.assertRaises(ValueError):
+            storage.update({"Fx": 1.0}, -5)
+
+    def test_write_index_never_moves_back(self):
+        # Out of order times only fill their own rows
+        storage = self.make_storage({"time": [0, 5, 2], "Fx": [0.0, 5.0, 2.0]}, timestep=1)
+        data = storage.data
+        self.assertEqual(data.index.tolist(), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(data["Fx"].iloc[2], 2.0)
+        self.assertEqual(data["Fx"].iloc[5], 5.0)
+
+        storage.update({"Fx": 1.0}, 1)
+        self.assertEqual(len(storage.data), 6)
+        self.assertEqual(storage.get_value("Fx", 5), 5.0)
+
+
+class TestArrayTimeSeriesStorage(TestTimeSeriesStorage):
+    def make_storage(self, initial_data=None, timestep=None, steps=4):
+        if initial_data is None:
+            initial_data = {"time": [], "Fx": []}
+        return ArrayTimeSeriesStorage(initial_data, "test", n_steps=steps, timestep=timestep)
+
+    def buffer_size(self, storage):
+        return storage._arr.shape[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,14 @@ import os
 from logging.handlers import RotatingFileHandler
 import datetime
 
-def setup_logger(log_name=None, log_dir='logs'):
+def setup_logger(log_name=None, log_dir='logs', level=None):
     """Set up a logger with both console and file handlers.
     
     Args:
         log_name: Name for the log file. If None, uses script filename
         log_dir: Directory for log files (created if doesn't exist)
+        level: Lowest level that is logged, e.g. logging.WARNING for long runs. If None, keeps the
+               level an earlier call set for this logger (DEBUG the first time)
     
     Returns:
         A configured logger object
@@ -23,7 +25,9 @@ def setup_logger(log_name=None, log_dir='logs'):
     
     # Create a logger
     logger = logging.getLogger(log_name)
-    logger.setLevel(logging.DEBUG)
+    if level is None:
+        level = logger.level if logger.level != logging.NOTSET else logging.DEBUG
+    logger.setLevel(level)
     
     # Remove existing handlers to avoid duplicates when function is called multiple times
     if logger.hasHandlers():
@@ -1,9 +1,14 @@
 # main.py
+import logging
 import numpy as np
 from car import Car, ElectricEngineCharacteristics
 from track import *
 from simulation import simulate_lap
 from forces import calculate_aerodynamic_drag, calculate_rolling_resistance
+from logger import setup_logger
+
+# Only warnings and errors are logged for a full run, the per-timestep logs are for debugging
+logger = setup_logger(level=logging.WARNING)
 
 # Define car parameters
 motor_torque_curve = [(0, 100), (1000, 95), (2000, 90), (3000, 80), (4000, 70), (5000, 60)]
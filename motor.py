@@ -2,12 +2,148 @@
 import pandas as pd
 import numpy as np
 from abc import ABC, abstractmethod
-from scipy import interpolate
+from helper_functions import njit, NJIT_OPTIONS
+
+def _sorted_curve(rpm, torque):
+    """
+    Returns the (rpm, torque) points of a curve as float arrays sorted by rpm.
+    """
+    rpm = np.ascontiguousarray(rpm, dtype=np.float64)
+    torque = np.asarray(torque, dtype=np.float64)
+    order = np.argsort(rpm, kind="stable")
+    return rpm[order], torque[order]
+
+@njit(**NJIT_OPTIONS)
+def _curve_torque_kernel(rpm, min_rpm, max_rpm, curve_rpm, curve_torque, clamp_ends, out):
+    """
+    Torque of a curve at each rpm, by binary search and linear interpolation between the curve points.
+    Zero outside [min_rpm, max_rpm]; past the ends of the curve the end torques if clamp_ends, else zero
+    (the same as np.interp with its default or zero left/right values).
+    """
+    n_points = curve_rpm.shape[0]
+    for i in range(rpm.shape[0]):
+        x = rpm[i]
+        if x < min_rpm or x > max_rpm:
+            out[i] = 0.0
+        elif x <= curve_rpm[0]:
+            out[i] = curve_torque[0] if (clamp_ends or x == curve_rpm[0]) else 0.0
+        elif x >= curve_rpm[n_points-1]:
+            out[i] = curve_torque[n_points-1] if (clamp_ends or x == curve_rpm[n_points-1]) else 0.0
+        else:
+            # Last curve point at or below x
+            lo = 0
+            hi = n_points - 1
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if curve_rpm[mid] <= x:
+                    lo = mid
+                else:
+                    hi = mid
+            t = (x - curve_rpm[lo]) / (curve_rpm[hi] - curve_rpm[lo])
+            out[i] = curve_torque[lo] + t * (curve_torque[hi] - curve_torque[lo])
 
 class MotorCharacteristics(ABC):
     """
     Abstract base class for motor characteristics.
+
+    The usage of the motor is recorded in preallocated arrays, one per column with its own dtype
+    and one row per timestep (of timestep_delta seconds), and usage_df is only built from them when
+    it is read.
     """
+    # Recorded columns and their dtypes (telemetry only, so float32 is precise enough)
+    usage_columns = {}
+
+    def _init_usage(self, expected_steps=1024):
+        """
+        Allocates the usage buffer.
+
+        Args:
+            expected_steps: Number of rows to preallocate, the buffer doubles when it is full.
+        """
+        # Zero initialized, so the timesteps that are skipped are recorded as zero torque and rpm
+        self._usage = {col: np.zeros(expected_steps, dtype=dtype) for col, dtype in self.usage_columns.items()}
+        self._capacity = expected_steps
+        self._first_step = None
+        self._n_steps = 0
+        self._usage_df = None
+        self.last_timestep = None
+
+    def _step_index(self, timestep):
+        """
+        Row of the usage buffer for a time in seconds.
+        """
+        return int(round(timestep / self.timestep_delta))
+
+    def _record_usage(self, timestep, values):
+        """
+        Records the usage at a timestep. Skipped timesteps keep their zero rows.
+
+        Args:
+            timestep: The current time in seconds.
+            values: Values of the usage_columns.
+        """
+        step = self._step_index(timestep)
+        if step < 0:
+            raise ValueError(f"Timestep {timestep} is before the start of the usage record.")
+        self._reserve_usage(step)
+
+        for values_col, value in zip(self._usage.values(), values):
+            values_col[step] = value
+        self._first_step = step if self._first_step is None else min(self._first_step, step)
+        self._n_steps = max(self._n_steps, step + 1)
+        self.last_timestep = timestep
+        self._usage_df = None
+
+    def _record_usage_array(self, timesteps, values):
+        """
+        Records the usage at several timesteps with a single store.
+
+        Args:
+            timesteps: Array of times in seconds.
+            values: Arrays of each of the usage_columns, with the usage at each time.
+        """
+        steps = np.rint(np.asarray(timesteps, dtype=np.float64) / self.timestep_delta).astype(np.intp)
+        if steps.size == 0:
+            return
+        if steps.min() < 0:
+            raise ValueError(f"Timestep {timesteps[np.argmin(steps)]} is before the start of the usage record.")
+        self._reserve_usage(steps.max())
+
+        for values_col, value in zip(self._usage.values(), values):
+            values_col[steps] = value
+        first_step = int(steps.min())
+        self._first_step = first_step if self._first_step is None else min(self._first_step, first_step)
+        self._n_steps = max(self._n_steps, int(steps.max()) + 1)
+        self.last_timestep = timesteps[-1]
+        self._usage_df = None
+
+    def _reserve_usage(self, step):
+        """
+        Grows the usage buffer by doubling until it has a row for the step.
+        """
+        if step >= self._capacity:
+            new_size = self._capacity
+            while step >= new_size:
+                new_size *= 2
+            for col, values_col in self._usage.items():
+                usage = np.zeros(new_size, dtype=values_col.dtype)
+                usage[:self._n_steps] = values_col[:self._n_steps]
+                self._usage[col] = usage
+            self._capacity = new_size
+
+    @property
+    def usage_df(self):
+        """
+        DataFrame of the recorded usage, indexed by time in seconds. Built on first access after a write.
+        """
+        if self._usage_df is None:
+            first = 0 if self._first_step is None else self._first_step
+            steps = np.arange(first, self._n_steps)
+            usage_df = pd.DataFrame({col: values_col[first:self._n_steps].copy() for col, values_col in self._usage.items()},
+                                    index=steps * self.timestep_delta)
+            self._usage_df = usage_df
+        return self._usage_df
+
     @abstractmethod
     def request_torque(self, rpm, requested_torque, timestep):
         """
@@ -28,6 +164,8 @@ class ElectricMotorCharacteristics(MotorCharacteristics):
     Represents the torque characteristics of an electric motor with continuous
     and peak torque curves.
     """
+    usage_columns = {'torque': np.float32, 'rpm': np.float32, 'is_continuous': np.bool_}
+
     def __init__(
         self, 
         continuous_torque_curve, 
@@ -49,36 +187,27 @@ class ElectricMotorCharacteristics(MotorCharacteristics):
         self.continuous_torque_curve = continuous_torque_curve
         self.peak_torque_curve = peak_torque_curve
         self.drivetrain_loss_percent = drivetrain_loss_percent
+        # Share of the motor torque that reaches the wheels, and its inverse
+        self._drivetrain_efficiency = 1.0 - drivetrain_loss_percent/100.0
+        self._inv_drivetrain_efficiency = 1.0/self._drivetrain_efficiency
         self.timestep_delta = timestep_delta
         
         # Create interpolation functions for both curves
         self._create_interpolation_functions()
         
-        # Initialize usage tracking dataframe
-        self.usage_df = pd.DataFrame(columns=['torque', 'rpm', 'is_continuous'])
-        self.last_timestep = None
+        # Initialize usage tracking
+        self._init_usage()
 
     def _create_interpolation_functions(self):
         """
-        Creates interpolation functions for continuous and peak torque curves.
+        Prepares the continuous and peak torque curves for interpolation.
         """
         cont_rpm, cont_torque = zip(*self.continuous_torque_curve)
         peak_rpm, peak_torque = zip(*self.peak_torque_curve)
         
-        # Create interpolation functions
-        self.continuous_interp = interpolate.interp1d(
-            cont_rpm, 
-            cont_torque, 
-            bounds_error=False, 
-            fill_value=(cont_torque[0], cont_torque[-1])
-        )
-        
-        self.peak_interp = interpolate.interp1d(
-            peak_rpm, 
-            peak_torque, 
-            bounds_error=False, 
-            fill_value=(peak_torque[0], peak_torque[-1])
-        )
+        # Curve points sorted by rpm, for np.interp (which clamps to the end torques outside the curve)
+        self._cont_rpm, self._cont_torque = _sorted_curve(cont_rpm, cont_torque)
+        self._peak_rpm, self._peak_torque = _sorted_curve(peak_rpm, peak_torque)
         
         # Store rpm ranges
         self.min_rpm = min(min(cont_rpm), min(peak_rpm))
@@ -96,7 +225,7 @@ class ElectricMotorCharacteristics(MotorCharacteristics):
         """
         if rpm < self.min_rpm or rpm > self.max_rpm:
             return 0
-        return float(self.continuous_interp(rpm))
+        return float(np.interp(rpm, self._cont_rpm, self._cont_torque))
 
     def calculate_peak_torque(self, rpm):
         """
@@ -110,7 +239,7 @@ class ElectricMotorCharacteristics(MotorCharacteristics):
         """
         if rpm < self.min_rpm or rpm > self.max_rpm:
             return 0
-        return float(self.peak_interp(rpm))
+        return float(np.interp(rpm, self._peak_rpm, self._peak_torque))
 
     def request_torque(self, rpm, requested_torque, timestep):
         """
@@ -125,7 +254,7 @@ class ElectricMotorCharacteristics(MotorCharacteristics):
             The actual torque delivered to the wheels in Newton-meters (Nm).
         """
         # Calculate motor torque needed to overcome drivetrain losses
-        motor_torque_required = requested_torque / (1 - self.drivetrain_loss_percent/100)
+        motor_torque_required = requested_torque * self._inv_drivetrain_efficiency
         
         # Determine maximum available torque at this RPM
         max_available_torque = self.calculate_peak_torque(rpm)
@@ -137,44 +266,47 @@ class ElectricMotorCharacteristics(MotorCharacteristics):
         torque_continuous = self.calculate_continuous_torque(rpm)>actual_motor_torque
 
         
-        # Fill in any missing timesteps with zeros
-        self._fill_missing_timesteps(timestep)
-        
         # Record this torque request
-        self.usage_df.loc[timestep] = [actual_motor_torque, rpm, torque_continuous]
-        self.last_timestep = timestep
+        self._record_usage(timestep, (actual_motor_torque, rpm, torque_continuous))
         
         # Return the torque that will be delivered to the wheels
-        wheel_torque = actual_motor_torque * (1 - self.drivetrain_loss_percent/100)
+        wheel_torque = actual_motor_torque * self._drivetrain_efficiency
         return wheel_torque
 
-    def _fill_missing_timesteps(self, current_timestep):
+    def request_torque_array(self, rpm, requested_torque, timesteps):
         """
-        Fills in any missing timesteps with zero torque and rpm.
-        
+        Requests torques for a whole trajectory at once, recording them like request_torque.
+
         Args:
-            current_timestep: The current timestep.
+            rpm: Array of the motor's RPM at each timestep.
+            requested_torque: Array of the requested torques at the wheels in Newton-meters (Nm).
+            timesteps: Array of the times in seconds.
+
+        Returns:
+            Array of the actual torques delivered to the wheels in Newton-meters (Nm).
         """
-        if self.last_timestep is None:
-            # First entry, nothing to fill
-            return
-            
-        # Calculate expected timesteps
-        expected_steps = np.arange(
-            self.last_timestep + self.timestep_delta, 
-            current_timestep, 
-            self.timestep_delta
-        )
-        
-        # Fill in zeros for any missing timesteps
-        for step in expected_steps:
-            if step not in self.usage_df.index:
-                self.usage_df.loc[step] = [0, 0]
+        rpm = np.ascontiguousarray(rpm, dtype=np.float64)
+        motor_torque_required = np.asarray(requested_torque, dtype=np.float64) * self._inv_drivetrain_efficiency
+
+        # Maximum available torque, zero outside the motor's rpm range
+        max_available_torque = np.empty_like(rpm)
+        _curve_torque_kernel(rpm, self.min_rpm, self.max_rpm, self._peak_rpm, self._peak_torque, True, max_available_torque)
+        actual_motor_torque = np.minimum(motor_torque_required, max_available_torque)
+        continuous_torque = np.empty_like(rpm)
+        _curve_torque_kernel(rpm, self.min_rpm, self.max_rpm, self._cont_rpm, self._cont_torque, True, continuous_torque)
+        torque_continuous = continuous_torque > actual_motor_torque
+
+        # Record the torque requests
+        self._record_usage_array(timesteps, (actual_motor_torque, rpm, torque_continuous))
+
+        return actual_motor_torque * self._drivetrain_efficiency
 
 class CombustionMotorCharacteristics(MotorCharacteristics):
     """
     Represents the torque characteristics of a combustion engine.
     """
+    usage_columns = {'torque': np.float32, 'rpm': np.float32}
+
     def __init__(self, torque_curve, drivetrain_loss_percent=0, timestep_delta=0.1):
         """
         Initializes a CombustionMotorCharacteristics object.
@@ -186,28 +318,25 @@ class CombustionMotorCharacteristics(MotorCharacteristics):
         """
         self.torque_curve = torque_curve
         self.drivetrain_loss_percent = drivetrain_loss_percent
+        # Share of the motor torque that reaches the wheels, and its inverse
+        self._drivetrain_efficiency = 1.0 - drivetrain_loss_percent/100.0
+        self._inv_drivetrain_efficiency = 1.0/self._drivetrain_efficiency
         self.timestep_delta = timestep_delta
         
         # Create interpolation function
         self._create_interpolation_function()
         
-        # Initialize usage tracking dataframe
-        self.usage_df = pd.DataFrame(columns=['torque', 'rpm'])
-        self.last_timestep = None
+        # Initialize usage tracking
+        self._init_usage()
 
     def _create_interpolation_function(self):
         """
-        Creates an interpolation function for the torque curve.
+        Prepares the torque curve for interpolation.
         """
         rpm, torque = zip(*self.torque_curve)
         
-        # Create interpolation function
-        self.torque_interp = interpolate.interp1d(
-            rpm, 
-            torque, 
-            bounds_error=False, 
-            fill_value=(0, 0)
-        )
+        # Curve points sorted by rpm, for np.interp
+        self._rpm, self._torque = _sorted_curve(rpm, torque)
         
         # Store rpm range
         self.min_rpm = min(rpm)
@@ -225,7 +354,7 @@ class CombustionMotorCharacteristics(MotorCharacteristics):
         """
         if rpm < self.min_rpm or rpm > self.max_rpm:
             return 0
-        return float(self.torque_interp(rpm))
+        return float(np.interp(rpm, self._rpm, self._torque, left=0, right=0))
 
     def request_torque(self, rpm, requested_torque, timestep):
         """
@@ -240,7 +369,7 @@ class CombustionMotorCharacteristics(MotorCharacteristics):
             The actual torque delivered to the wheels in Newton-meters (Nm).
         """
         # Calculate engine torque needed to overcome drivetrain losses
-        engine_torque_required = requested_torque / (1 - self.drivetrain_loss_percent/100)
+        engine_torque_required = requested_torque * self._inv_drivetrain_efficiency
         
         # Determine maximum available torque at this RPM
         max_available_torque = self.calculate_torque(rpm)
@@ -248,37 +377,35 @@ class CombustionMotorCharacteristics(MotorCharacteristics):
         # The actual torque is the minimum of what was requested and what's available
         actual_engine_torque = min(engine_torque_required, max_available_torque)
         
-        # Fill in any missing timesteps with zeros
-        self._fill_missing_timesteps(timestep)
-        
         # Record this torque request
-        self.usage_df.loc[timestep] = [actual_engine_torque, rpm]
-        self.last_timestep = timestep
+        self._record_usage(timestep, (actual_engine_torque, rpm))
         
         # Return the torque that will be delivered to the wheels
-        wheel_torque = actual_engine_torque * (1 - self.drivetrain_loss_percent/100)
+        wheel_torque = actual_engine_torque * self._drivetrain_efficiency
         return wheel_torque
 
-    def _fill_missing_timesteps(self, current_timestep):
+    def request_torque_array(self, rpm, requested_torque, timesteps):
         """
-        Fills in any missing timesteps with zero torque and rpm.
-        
+        Requests torques for a whole trajectory at once, recording them like request_torque.
+
         Args:
-            current_timestep: The current timestep.
+            rpm: Array of the engine's RPM at each timestep.
+            requested_torque: Array of the requested torques at the wheels in Newton-meters (Nm).
+            timesteps: Array of the times in seconds.
+
+        Returns:
+            Array of the actual torques delivered to the wheels in Newton-meters (Nm).
         """
-        if self.last_timestep is None:
-            # First entry, nothing to fill
-            return
-            
-        # Calculate expected timesteps
-        expected_steps = np.arange(
-            self.last_timestep + self.timestep_delta, 
-            current_timestep, 
-            self.timestep_delta
-        )
-        
-        # Fill in zeros for any missing timesteps
-        for step in expected_steps:
-            if step not in self.usage_df.index:
-                self.usage_df.loc[step] = [0, 0]
+        rpm = np.ascontiguousarray(rpm, dtype=np.float64)
+        engine_torque_required = np.asarray(requested_torque, dtype=np.float64) * self._inv_drivetrain_efficiency
+
+        # Maximum available torque, zero outside the engine's rpm range
+        max_available_torque = np.empty_like(rpm)
+        _curve_torque_kernel(rpm, self.min_rpm, self.max_rpm, self._rpm, self._torque, False, max_available_torque)
+        actual_engine_torque = np.minimum(engine_torque_required, max_available_torque)
+
+        # Record the torque requests
+        self._record_usage_array(timesteps, (actual_engine_torque, rpm))
+
+        return actual_engine_torque * self._drivetrain_efficiency
 
@@ -1,8 +1,9 @@
 
 # dynamics.py
-from forces import calculate_aerodynamic_drag, calculate_rolling_resistance, calculate_downforce
 from car import Car
 from track import TrackSegment
+from helper_functions import njit, NJIT_OPTIONS, prange
+import math
 import pandas as pd
 import numpy as np
 
@@ -38,182 +39,291 @@ def calculate_lateral_forces(car, velocity, radius):
 
 
 
-def simulate_straight_segment(car, segment, initial_velocity, initial_x, initial_y, initial_angle, time_step=0.1):
-    velocity = initial_velocity
-    distance = 0
-    time = 0
-    x = initial_x
-    y = initial_y
-    angle = initial_angle  # Current direction of the car
-    
-    # Lists to store data
-    times = []
-    distances = []
-    velocities = []
-    accelerations = []
-    x_positions = []
-    y_positions = []
-    angles = []
-    
-    while distance < segment.length:
-        # Calculate forces
-        aero_drag = calculate_aerodynamic_drag(car, velocity)
-        rolling_resistance = calculate_rolling_resistance(car)
-        downforce = calculate_downforce(car, velocity)
-        
-        # Calculate normal forces and traction limits
-        normal_force_front, normal_force_rear = calculate_normal_forces(car, 0, downforce)
-        traction_limit_front, traction_limit_rear = calculate_traction_limits(car, normal_force_front, normal_force_rear)
-        
-        # Calculate driver inputs
-        throttle_force = car.calculate_throttle_force()
-        brake_force = car.calculate_brake_force()
-        
-        # Net traction force (considering throttle and brake)
-        net_traction_force = throttle_force - brake_force
-        traction_force = min(net_traction_force, traction_limit_front + traction_limit_rear)
-        
-        # Net force
-        net_force = traction_force - aero_drag - rolling_resistance
-        
-        # Acceleration
-        acceleration = net_force / car.mass
-        
-        # Update velocity and distance
-        velocity += acceleration * time_step
-        delta_distance = velocity * time_step
-        distance += delta_distance
-        time += time_step
-        
-        # Update position (straight segment: no curvature)
-        x += delta_distance * np.cos(angle)
-        y += delta_distance * np.sin(angle)
-        
-        # Store results
-        times.append(time)
-        distances.append(distance)
-        velocities.append(velocity)
-        accelerations.append(acceleration)
-        x_positions.append(x)
-        y_positions.append(y)
-        angles.append(angle)
-    
-    return times, distances, velocities, accelerations, x_positions, y_positions, angles
+@njit(**NJIT_OPTIONS)
+def _terminal_velocity(mass, drag_coeff, frontal_area, rolling_resistance_coeff, tire_grip,
+                       throttle_force, brake_force):
+    """
+    Lower bound of the steady-state velocity, where the drag balances the driving force (0.0 if the
+    car cannot hold any speed). Downforce is left out, so the traction limit used is the static one.
+    """
+    AIR_DENSITY = 1.225  # kg/m^3
+    GRAVITY = 9.81  # m/s^2
 
+    drag_k = 0.5 * AIR_DENSITY * drag_coeff * frontal_area
+    driving_force = min(throttle_force - brake_force, tire_grip * mass * GRAVITY)
+    excess_force = driving_force - rolling_resistance_coeff * mass * GRAVITY
+    if excess_force <= 0.0 or drag_k <= 0.0:
+        return 0.0
+    return math.sqrt(excess_force / drag_k)
 
 
-def simulate_cornering_segment(car, segment, initial_velocity, initial_x, initial_y, initial_angle, time_step=0.1):
-    velocity = initial_velocity
-    distance = 0
-    time = 0
-    x = initial_x
-    y = initial_y
-    angle = initial_angle  # Current direction of the car
-    
-    # Lists to store data
-    times = []
-    distances = []
-    velocities = []
-    accelerations = []
-    x_positions = []
-    y_positions = []
-    angles = []
-    
-    # Corner parameters
-    curvature = segment.curvature
-    radius = 1 / curvature if curvature != 0 else float('inf')
-    
-    while distance < segment.length:
-        # Calculate forces
-        aero_drag = calculate_aerodynamic_drag(car, velocity)
-        rolling_resistance = calculate_rolling_resistance(car)
-        downforce = calculate_downforce(car, velocity)
-        
-        # Calculate normal forces and traction limits
-        normal_force_front, normal_force_rear = calculate_normal_forces(car, 0, downforce)
-        traction_limit_front, traction_limit_rear = calculate_traction_limits(car, normal_force_front, normal_force_rear)
-        
-        # Calculate driver inputs
-        throttle_force = car.calculate_throttle_force()
-        brake_force = car.calculate_brake_force()
-        
-        # Net traction force (considering throttle and brake)
-        net_traction_force = throttle_force - brake_force
-        traction_force = min(net_traction_force, traction_limit_front + traction_limit_rear)
-        
+@njit(**NJIT_OPTIONS)
+def _simulate_segment(curvature, length, v0, x0, y0, ang0, dt,
+                      mass, drag_coeff, downforce_coeff, frontal_area, rolling_resistance_coeff,
+                      cg_front, cg_rear, cg_height, wheelbase, tire_grip, throttle_force, brake_force):
+    """
+    Steps the car along one segment (a straight if curvature is 0) until its length is covered.
+    Only scalars are passed in, the car's parameters and driver forces are unpacked by the callers.
+
+    Returns:
+        (7, n_steps) array with the rows time, distance, velocity, acceleration, x, y, angle.
+    """
+    # Output rows, grown by doubling if the segment takes more steps than estimated
+    n_max = int(length / (max(v0, 1.0) * dt)) * 2 + 64
+    out, k = _step_segment(np.empty((7, n_max)), 0, curvature, length, v0, x0, y0, ang0, dt,
+                           mass, drag_coeff, downforce_coeff, frontal_area, rolling_resistance_coeff,
+                           cg_front, cg_rear, cg_height, wheelbase, tire_grip, throttle_force, brake_force)
+    return out[:, :k]
+
+
+@njit(**NJIT_OPTIONS)
+def _step_segment(out, k, curvature, length, v0, x0, y0, ang0, dt,
+                  mass, drag_coeff, downforce_coeff, frontal_area, rolling_resistance_coeff,
+                  cg_front, cg_rear, cg_height, wheelbase, tire_grip, throttle_force, brake_force):
+    """
+    Stepping loop of _simulate_segment, writing the steps into the columns of out from k on.
+
+    Returns:
+        The output array (a bigger copy if it had to grow) and the index after the last step.
+    """
+    AIR_DENSITY = 1.225  # kg/m^3
+    GRAVITY = 9.81  # m/s^2
+
+    # Velocity independent terms, computed once for the segment
+    drag_k = 0.5 * AIR_DENSITY * drag_coeff * frontal_area
+    df_k = 0.5 * AIR_DENSITY * downforce_coeff * frontal_area
+    rolling_resistance = rolling_resistance_coeff * mass * GRAVITY
+    static_nf_front = mass * GRAVITY * cg_rear / wheelbase
+    static_nf_rear = mass * GRAVITY * cg_front / wheelbase
+    # Net traction force (considering throttle and brake)
+    net_driver_force = throttle_force - brake_force
+
+    velocity = v0
+    distance = 0.0
+    time = 0.0
+    x = x0
+    y = y0
+    angle = ang0  # Current direction of the car
+
+    while distance < length:
+        # Calculate forces (drag and downforce share the same v^2)
+        v2 = velocity * velocity
+        aero_drag = drag_k * v2
+        downforce = df_k * v2
+
+        # Calculate normal forces (no acceleration, so no weight transfer) and traction limits
+        normal_force_front = static_nf_front + 0.5 * downforce
+        normal_force_rear = static_nf_rear + 0.5 * downforce
+        traction_limit_front = tire_grip * normal_force_front
+        traction_limit_rear = tire_grip * normal_force_rear
+
+        # Clip the driving force to the tire grip (compiles to a single min instruction)
+        traction_limit = traction_limit_front + traction_limit_rear
+        traction_force = net_driver_force if net_driver_force < traction_limit else traction_limit
+
         # Net force
         net_force = traction_force - aero_drag - rolling_resistance
-        
+
         # Acceleration
-        acceleration = net_force / car.mass
-        
+        acceleration = net_force / mass
+
         # Update velocity and distance
-        velocity += acceleration * time_step
-        delta_distance = velocity * time_step
+        velocity += acceleration * dt
+        delta_distance = velocity * dt
         distance += delta_distance
-        time += time_step
-        
-        # Update position and angle (cornering)
-        delta_angle = delta_distance * curvature  # Change in angle due to curvature
+        time += dt
+
+        # Update position and angle (no change of angle on a straight)
+        delta_angle = delta_distance * curvature
         angle += delta_angle
-        
+
         # Update x and y based on the average angle during the time step
         avg_angle = angle - delta_angle / 2  # Use midpoint angle for smoother path
-        x += delta_distance * np.cos(avg_angle)
-        y += delta_distance * np.sin(avg_angle)
-        
+        x += delta_distance * math.cos(avg_angle)
+        y += delta_distance * math.sin(avg_angle)
+
         # Store results
-        times.append(time)
-        distances.append(distance)
-        velocities.append(velocity)
-        accelerations.append(acceleration)
-        x_positions.append(x)
-        y_positions.append(y)
-        angles.append(angle)
-    
-    return times, distances, velocities, accelerations, x_positions, y_positions, angles
+        if k == out.shape[1]:
+            grown = np.empty((7, max(2 * k, 64)))
+            grown[:, :k] = out
+            out = grown
+        out[0, k] = time
+        out[1, k] = distance
+        out[2, k] = velocity
+        out[3, k] = acceleration
+        out[4, k] = x
+        out[5, k] = y
+        out[6, k] = angle
+        k += 1
 
+    return out, k
+
+
+def _car_params(car):
+    """
+    Unpacks the car's parameters and current driver forces into the scalar tuple taken by the kernels.
+    """
+    # Calculate driver inputs
+    throttle_force = car.calculate_throttle_force()
+    brake_force = car.calculate_brake_force()
+
+    return (float(car.mass), float(car.drag_coeff), float(car.downforce_coeff), float(car.frontal_area),
+            float(car.rolling_resistance), float(car.cg_front), float(car.cg_rear), float(car.cg_height),
+            float(car.wheelbase), float(car.tire_grip), float(throttle_force), float(brake_force))
+
+
+def _simulate_car_segment(car, curvature, length, initial_velocity, initial_x, initial_y, initial_angle, time_step):
+    """
+    Runs _simulate_segment with the car's parameters and current driver forces.
+    """
+    t, d, v, a, x, y, ang = _simulate_segment(
+        float(curvature), float(length), float(initial_velocity), float(initial_x), float(initial_y),
+        float(initial_angle), float(time_step), *_car_params(car),
+    )
+    return t, d, v, a, x, y, ang
+
+
+def simulate_straight_segment(car, segment, initial_velocity, initial_x, initial_y, initial_angle, time_step=0.1):
+    return _simulate_car_segment(car, 0.0, segment.length, initial_velocity, initial_x, initial_y, initial_angle, time_step)
+
+
+
+def simulate_cornering_segment(car, segment, initial_velocity, initial_x, initial_y, initial_angle, time_step=0.1):
+    return _simulate_car_segment(car, segment.curvature, segment.length, initial_velocity, initial_x, initial_y, initial_angle, time_step)
+
+
+@njit(**NJIT_OPTIONS)
+def _lap_steps_bound(lengths, v0, dt, mass, drag_coeff, frontal_area, rolling_resistance_coeff,
+                     tire_grip, throttle_force, brake_force):
+    """
+    Estimate of the number of steps of a lap, used to size the lap buffers (which still grow if it is short).
+    """
+    # The velocity never drops below min(v0, terminal velocity), which bounds the steps of every segment.
+    # Speeds under 1 m/s are floored so a near-standstill start does not reserve a huge buffer for a car
+    # that accelerates away at once.
+    v_low = min(v0, _terminal_velocity(mass, drag_coeff, frontal_area, rolling_resistance_coeff, tire_grip,
+                                       throttle_force, brake_force))
+    if v_low <= 0.0:
+        return int(lengths.sum() / (max(v0, 1.0) * dt)) * 2 + 64
+    v_low = max(v_low, 1.0)
+    n_max = 0
+    for i in range(lengths.shape[0]):
+        n_max += int(math.ceil(lengths[i] / (v_low * dt))) + 1
+    return n_max
+
+
+@njit(**NJIT_OPTIONS)
+def simulate_lap_kernel(lengths, curvatures, v0, dt,
+                        mass, drag_coeff, downforce_coeff, frontal_area, rolling_resistance_coeff,
+                        cg_front, cg_rear, cg_height, wheelbase, tire_grip, throttle_force, brake_force):
+    """
+    Steps the car through every segment of the lap, carrying velocity, position and angle over.
+
+    Args:
+        lengths: Length of each segment.
+        curvatures: Signed curvature of each segment, 0.0 for straights.
+
+    Returns:
+        (7, n_steps) array with the rows time, distance, velocity, acceleration, x, y, angle.
+        Time and distance restart at every segment.
+    """
+    # Lap buffer sized once up front (it can still grow if the bound is missed)
+    n_max = _lap_steps_bound(lengths, v0, dt, mass, drag_coeff, frontal_area, rolling_resistance_coeff,
+                             tire_grip, throttle_force, brake_force)
+    out = np.empty((7, n_max))
+    k = 0
+
+    velocity = v0
+    x = 0.0
+    y = 0.0
+    angle = 0.0  # Start facing along the positive x-axis
+
+    for i in range(lengths.shape[0]):
+        out, k_end = _step_segment(out, k, curvatures[i], lengths[i], velocity, x, y, angle, dt,
+                                   mass, drag_coeff, downforce_coeff, frontal_area, rolling_resistance_coeff,
+                                   cg_front, cg_rear, cg_height, wheelbase, tire_grip, throttle_force, brake_force)
 
-def simulate_lap(car, segments, initial_velocity):
-    times = []
-    distances = []
-    velocities = []
-    accelerations = []
-    x_positions = []
-    y_positions = []
-    angles = []
-    
-    # Initialize position and angle
-    current_x = 0.0
-    current_y = 0.0
-    current_angle = 0.0  # Start facing along the positive x-axis
-    
-    for segment in segments:
-        if segment.curvature == 0:  # Straight segment
-            t, d, v, a, x, y, ang = simulate_straight_segment(
-                car, segment, initial_velocity, current_x, current_y, current_angle
-            )
-        else:  # Cornering segment
-            t, d, v, a, x, y, ang = simulate_cornering_segment(
-                car, segment, initial_velocity, current_x, current_y, current_angle
-            )
-        
-        # Append results
-        times.extend(t)
-        distances.extend(d)
-        velocities.extend(v)
-        accelerations.extend(a)
-        x_positions.extend(x)
-        y_positions.extend(y)
-        angles.extend(ang)
-        
         # Update initial conditions for the next segment
-        initial_velocity = velocities[-1]
-        current_x = x_positions[-1]
-        current_y = y_positions[-1]
-        current_angle = angles[-1]
-    
-    return times, distances, velocities, accelerations, x_positions, y_positions
+        if k_end > k:
+            k = k_end
+            velocity = out[2, k - 1]
+            x = out[4, k - 1]
+            y = out[5, k - 1]
+            angle = out[6, k - 1]
+
+    return out[:, :k]
+
+
+@njit(parallel=True, **NJIT_OPTIONS)
+def _simulate_lap_trials(car_params, lengths, curvatures, v0, dt, out, n_steps):
+    """
+    Runs simulate_lap_kernel for each row of car_params, one trial per thread, copying each lap
+    into out[:, k] when it fits (n_steps[k] is always set, so the caller can spot the ones that did not).
+    """
+    for k in prange(car_params.shape[0]):
+        p = car_params[k]
+        lap = simulate_lap_kernel(lengths, curvatures, v0, dt, p[0], p[1], p[2], p[3], p[4], p[5],
+                                  p[6], p[7], p[8], p[9], p[10], p[11])
+        n = lap.shape[1]
+        n_steps[k] = n
+        if n <= out.shape[2]:
+            out[:, k, :n] = lap
+
+
+def simulate_lap_batch(car_params_array, lengths, curvatures, v0, dt=0.1):
+    """
+    Simulates the same lap for many car setups in parallel, e.g. for parameter sweeps.
+
+    Args:
+        car_params_array: (n_trials, 12) array, one row per setup in the order of _car_params
+                          (np.array([_car_params(car) for car in cars]) builds it from cars).
+        lengths: Length of each segment.
+        curvatures: Signed curvature of each segment, 0.0 for straights.
+        v0: Initial velocity (m/s).
+        dt: Time step (s).
+
+    Returns:
+        (7, n_trials, n_steps) array with the rows time, distance, velocity, acceleration, x, y, angle,
+        padded with NaN after the end of the shorter laps, and the number of steps of each trial.
+    """
+    car_params_array = np.ascontiguousarray(car_params_array, dtype=np.float64)
+    lengths = np.ascontiguousarray(lengths, dtype=np.float64)
+    curvatures = np.ascontiguousarray(curvatures, dtype=np.float64)
+    n_trials = car_params_array.shape[0]
+
+    # Size the outputs from the largest step estimate of the trials
+    n_max = max((_lap_steps_bound(lengths, float(v0), float(dt), p[0], p[1], p[3], p[4], p[9], p[10], p[11])
+                 for p in car_params_array), default=0)
+    out = np.full((7, n_trials, n_max), np.nan)
+    n_steps = np.zeros(n_trials, dtype=np.int64)
+    _simulate_lap_trials(car_params_array, lengths, curvatures, float(v0), float(dt), out, n_steps)
+
+    # Rerun the trials that overran the estimate into a bigger output
+    if n_trials and n_steps.max() > n_max:
+        grown = np.full((7, n_trials, n_steps.max()), np.nan)
+        grown[:, :, :n_max] = out
+        for k in np.flatnonzero(n_steps > n_max):
+            p = car_params_array[k]
+            grown[:, k, :n_steps[k]] = simulate_lap_kernel(lengths, curvatures, float(v0), float(dt), *p)
+        out = grown
+
+    return out[:, :, :n_steps.max(initial=0)], n_steps
+
+
+def _segment_arrays(segments):
+    """
+    Returns the lengths and curvatures of the segments, taken straight from a Track when given one.
+    """
+    if hasattr(segments, "lengths") and hasattr(segments, "curvatures"):
+        return segments.lengths, segments.curvatures
+    lengths = np.array([segment.length for segment in segments], dtype=np.float64)
+    curvatures = np.array([segment.curvature for segment in segments], dtype=np.float64)
+    return lengths, curvatures
 
 
+def simulate_lap(car, segments, initial_velocity, time_step=0.1):
+    lengths, curvatures = _segment_arrays(segments)
+    out = simulate_lap_kernel(lengths, curvatures, float(initial_velocity), float(time_step), *_car_params(car))
 
+    # Time, distance, velocity, acceleration, x and y
+    return tuple(out[:6])
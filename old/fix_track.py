@@ -1,6 +1,8 @@
 
 import csv
 import os
+import numpy as np
+import pandas as pd
 
 def fix_turns(input_csv_path, output_csv_path):
     """
@@ -12,29 +14,28 @@ def fix_turns(input_csv_path, output_csv_path):
         output_csv_path (str): Path to the output CSV file.
     """
 
-    rows = []
-    with open(input_csv_path, 'r') as infile:
-        reader = csv.reader(infile)
-        rows = list(reader)
+    # csv.reader keeps every field as text and accepts rows of any length
+    with open(input_csv_path, 'r', newline='') as infile:
+        rows = list(csv.reader(infile))
 
+    # Positions of the turns that follow a turn, from a mask over the first column
+    directions = pd.Series([row[0] if row else '' for row in rows], dtype=object).str.strip().str.lower().to_numpy()
+    is_turn = (directions == 'left') | (directions == 'right')
+    insert_at = np.flatnonzero(is_turn[:-1] & is_turn[1:]) + 1
+
+    # Splice the filler straight in front of each of them
     fixed_rows = []
-    i = 0
-    while i < len(rows):
-        fixed_rows.append(rows[i])
-        if i < len(rows) - 1:
-            current_direction = rows[i][0].strip().lower()
-            next_direction = rows[i + 1][0].strip().lower()
-
-            if current_direction in ('left', 'right') and \
-               next_direction in ('left', 'right'):
-                fixed_rows.append(['Straight', '0.01', '0'])
-        i += 1
+    start = 0
+    for index in insert_at:
+        fixed_rows.extend(rows[start:index])
+        fixed_rows.append(['Straight', '0.01', '0'])
+        start = index
+    fixed_rows.extend(rows[start:])
 
     with open(output_csv_path, 'w', newline='') as outfile:
         writer = csv.writer(outfile)
         writer.writerows(fixed_rows)
 
-
 if __name__ == "__main__":
     tracks_directory = "tracks"
     input_file = '2021_michigan.csv'  # Replace with your input file name
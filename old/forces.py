@@ -1,5 +1,10 @@
 # forces.py
+# Annotations are not evaluated, so Car does not need to be imported
+from __future__ import annotations
+
+import math
 import numpy as np
+from helper_functions import njit, NJIT_OPTIONS, prange
 
 
 
@@ -54,18 +59,45 @@ def combined_weight_transfer(
         rear_left: Total weight transfer on rear-left wheel (N)
         rear_right: Total weight transfer on rear-right wheel (N)
     """
-    # Longitudinal transfer (front/rear)
-    delta_front, delta_rear = longitudinal_weight_transfer(car, a_x, t)
-    
-    # Lateral transfer (left/right)
-    delta_left, delta_right = lateral_weight_transfer(car, a_y, t)
-    
-    # Combine effects for each wheel
-    front_left = delta_front + delta_left
-    front_right = delta_front + delta_right
-    rear_left = delta_rear + delta_left
-    rear_right = delta_rear + delta_right
-    
+    # Broadcast the inputs against each other (e.g. a scalar a_y on a straight) and flatten them for the kernel
+    a_x, a_y, t = np.broadcast_arrays(
+        np.asarray(a_x, dtype=np.float64), np.asarray(a_y, dtype=np.float64), np.asarray(t, dtype=np.float64)
+    )
+    shape = t.shape
+
+    transfers = _combined_weight_transfer_kernel(
+        float(car.mass), float(car.cg_height), float(car.wheelbase), float(car.track_width),
+        float(car.tau_long), float(car.tau_lat),
+        np.ravel(a_x), np.ravel(a_y), np.ravel(t),
+    )
+    return tuple(transfer.reshape(shape) for transfer in transfers)
+
+@njit(parallel=True, **NJIT_OPTIONS)
+def _combined_weight_transfer_kernel(mass, cg_height, wheelbase, track_width, tau_long, tau_lat, a_x, a_y, t):
+    """
+    Longitudinal and lateral transfer with their first-order lags, combined per wheel in one pass.
+    """
+    n = t.shape[0]
+    front_left = np.empty(n)
+    front_right = np.empty(n)
+    rear_left = np.empty(n)
+    rear_right = np.empty(n)
+
+    for i in prange(n):
+        # Apply first-order lag for suspension dynamics
+        lag_long = 1.0 - math.exp(-t[i] / tau_long)
+        lag_lat = 1.0 - math.exp(-t[i] / tau_lat)
+
+        # Steady-state weight transfer (rigid-body) scaled by the lag
+        delta_front = -(mass * a_x[i] * cg_height) / wheelbase * lag_long
+        delta_left = (mass * a_y[i] * cg_height) / track_width * lag_lat
+
+        # Combine effects for each wheel
+        front_left[i] = delta_front + delta_left
+        front_right[i] = delta_front - delta_left
+        rear_left[i] = -delta_front + delta_left
+        rear_right[i] = -delta_front - delta_left
+
     return front_left, front_right, rear_left, rear_right
 
 def calculate_aerodynamic_drag(car, velocity):
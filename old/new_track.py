@@ -1,12 +1,15 @@
 
 import pandas as pd 
 import numpy as np
-import matplotlib.pyplot as plt
 import math 
 
 
 class DynamicGraph:
     def __init__(self, colormap="viridis"):
+        # matplotlib is only imported once a graph is made, so the track
+        # geometry can be used without a GUI backend.
+        import matplotlib.pyplot as plt
+
         # List to hold (x, y) points.
         self.points = []
         # Create the figure and axis.
@@ -67,8 +70,8 @@ class DynamicGraph:
             
             # Redraw the canvas.
             self.fig.canvas.draw_idle()
-            # Pause briefly to allow an update in interactive mode.
-            plt.pause(0.1)
+            # Let the GUI process the redraw (plt is no longer a module global).
+            self.fig.canvas.flush_events()
     
     def add_points(self, new_points):
         """
@@ -275,18 +278,16 @@ class Track:
 
 
 
-graph = DynamicGraph()
-plt.show()
-plt.ioff()
-# graph.add_points([(x, np.sin(x)) for x in np.linspace(0, 4*np.pi, 50)])
-
-
-# track = Track.from_csv("tracks/testing.csv")
-track = Track.from_csv("tracks/2021_michigan.csv")
-
-track.plot_track(graph, initial_angle=260)
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
 
-import pdb;pdb.set_trace()
+    graph = DynamicGraph()
+    plt.show()
+    plt.ioff()
+    # graph.add_points([(x, np.sin(x)) for x in np.linspace(0, 4*np.pi, 50)])
 
 
+    # track = Track.from_csv("tracks/testing.csv")
+    track = Track.from_csv("tracks/2021_michigan.csv")
 
+    track.plot_track(graph, initial_angle=260)
@@ -57,7 +57,6 @@ def initial_simulation_loop():
             # We will be using the accelerate tires method for this. For now, there is not consideration of lateral forces. 
 
             ev.accelerate_tires(acceleration_proportion=1)
-            import pdb; pdb.set_trace()
             # Next, we should apply the forces to the car. 
             pass # This involves calculating the resultant vector that we get based on all the forces on the car
 
@@ -78,21 +77,21 @@ def compute_acceleration_timestep(
     if cornering_force ==0:
         # For maintaining speed 
         if abs(current_velocity - target_velocity) < speed_error:
-            logger.debug(f"| Maintaining Velocity |  Current Velocity: {current_velocity}  |  Target Velocity: {target_velocity}")
+            logger.debug("| Maintaining Velocity |  Current Velocity: %s  |  Target Velocity: %s", current_velocity, target_velocity)
 
         elif target_velocity - current_velocity > speed_error:
-            logger.debug(f"|      Accelerating    |  Current Velocity: {current_velocity}  |  Target Velocity: {target_velocity}")
+            logger.debug("|      Accelerating    |  Current Velocity: %s  |  Target Velocity: %s", current_velocity, target_velocity)
 
     # If so, we can assume we want to accelerate
         elif target_velocity - current_velocity < speed_error:
-            logger.debug(f"|         Braking      |  Current Velocity: {current_velocity}  |  Target Velocity: {target_velocity}")
+            logger.debug("|         Braking      |  Current Velocity: %s  |  Target Velocity: %s", current_velocity, target_velocity)
             # At a speed of 1, wanting to go to 2. 
             # Add speed error (0.5), then make sure its still negative. 
             # Being negative means that 
             #2-1 > 0.5 ; 1>0.5 True ; accelerate
             #2-1 < 0.5 ; 1<0.5 not true 
     else: 
-        logger.warning(f"This is only meant to simulate acceleration, yet cornering fraction of {cornering_force} provided")
+        logger.warning("This is only meant to simulate acceleration, yet cornering fraction of %s provided", cornering_force)
       pass
 
 
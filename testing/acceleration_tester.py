@@ -1,11 +1,13 @@
-from car_tester import ev
-from motor_tester import emrax_208
+import logging
 from logger import setup_logger
-import pandas as pd
 
+# Only warnings and errors are logged for a full run, the per-timestep logs are for debugging.
+# Set before the simulation modules are imported, they share this logger and keep its level.
+logger = setup_logger(level=logging.WARNING)
 
-# Example usage
-logger = setup_logger()
+from car_tester import ev
+from motor_tester import emrax_208
+import pandas as pd
 
 # # Now you can use logger throughout your script:
 # logger.debug("Detailed debug information (file only)")
@@ -38,7 +40,6 @@ def accelerate_straightline(length, car=ev):
         ev.get_vertical_load(ev.current_time)
 
         ev.accelerate_tires(acceleration_proportion=1, longitudinal_mode='accelerate')
-        # import pdb; pdb.set_trace()
         ev.calculate_timestep(ev.current_time)
         
         ev.current_time = ev.timestep+ev.current_time
@@ -104,21 +105,21 @@ def compute_acceleration_timestep(
     if cornering_force ==0:
         # For maintaining speed 
         if abs(current_velocity - target_velocity) < speed_error:
-            logger.debug(f"| Maintaining Velocity |  Current Velocity: {current_velocity}  |  Target Velocity: {target_velocity}")
+            logger.debug("| Maintaining Velocity |  Current Velocity: %s  |  Target Velocity: %s", current_velocity, target_velocity)
 
         elif target_velocity - current_velocity > speed_error:
-            logger.debug(f"|      Accelerating    |  Current Velocity: {current_velocity}  |  Target Velocity: {target_velocity}")
+            logger.debug("|      Accelerating    |  Current Velocity: %s  |  Target Velocity: %s", current_velocity, target_velocity)
 
     # If so, we can assume we want to accelerate
         elif target_velocity - current_velocity < speed_error:
-            logger.debug(f"|         Braking      |  Current Velocity: {current_velocity}  |  Target Velocity: {target_velocity}")
+            logger.debug("|         Braking      |  Current Velocity: %s  |  Target Velocity: %s", current_velocity, target_velocity)
             # At a speed of 1, wanting to go to 2. 
             # Add speed error (0.5), then make sure its still negative. 
             # Being negative means that 
             #2-1 > 0.5 ; 1>0.5 True ; accelerate
             #2-1 < 0.5 ; 1<0.5 not true 
     else: 
-        logger.warning(f"This is only meant to simulate acceleration, yet cornering fraction of {cornering_force} provided")
+        logger.warning("This is only meant to simulate acceleration, yet cornering fraction of %s provided", cornering_force)
         pass
  #
        
@@ -1,7 +1,5 @@
 # magic_formula_tire.py
 import numpy as np
-from scipy.integrate import solve_ivp
-import matplotlib.pyplot as plt
 import math
 from scipy.interpolate import RegularGridInterpolator
 from scipy.optimize import fsolve
@@ -17,6 +15,48 @@ logger.info("Starting Car.py Script")
 # logger.error("Error message (file and console)")
 # logger.critical("Critical failure (file and console)")
 
+def _temperature_effect(p, temp):
+    """Grip factor (0.5-1.0) of the tire temperature(s) [°C], a bell curve around the optimal temperature."""
+    temp_effect = 1.0 - p['grip_temp_factor'] * ((temp - p['temp_opt'])**2 / (p['temp_range']**2))
+    return np.clip(temp_effect, 0.5, 1.0)
+
+
+def _pure_longitudinal_force(p, kappa, Fz, dfz, temp_effect):
+    """Pure longitudinal force Fx0 of the simplified Magic Formula, for scalars or arrays."""
+    B = p['p_Kx1'] * (1 + p['p_Kx2'] * dfz) * Fz / (p['p_Cx1'] * p['p_Dx1'] * Fz)
+    C = p['p_Cx1']
+    D = p['p_Dx1'] * Fz * (1 + p['p_Dx2'] * dfz) * p['lambda_mux'] * temp_effect
+    E = p['p_Ex1']
+    return D * np.sin(C * np.arctan(B * kappa - E * (B * kappa - np.arctan(B * kappa))))
+
+
+def _pure_lateral_force(p, alpha, Fz, dfz, gamma, temp_effect):
+    """Pure lateral force Fy0 of the simplified Magic Formula, for scalars or arrays."""
+    B = p['p_Ky1'] * Fz / (p['p_Cy1'] * p['p_Dy1'] * Fz * p['p_Ky2'])
+    C = p['p_Cy1']
+    D = abs(p['p_Dy1']) * Fz * (1 + p['p_Dy2'] * dfz) * p['lambda_muy'] * temp_effect
+    E = p['p_Ey1']
+    return D * np.sin(C * np.arctan(B * alpha - E * (B * alpha - np.arctan(B * alpha)))) + 0.1 * gamma * Fz
+
+
+def _combined_longitudinal_force(p, alpha, Fx0):
+    """Pure longitudinal force reduced by the combined slip cosine factor of the slip angle."""
+    return Fx0 * np.cos(p['r_Bx1'] * np.abs(alpha))
+
+
+def _combined_lateral_force(p, kappa, Fy0):
+    """Pure lateral force reduced by the combined slip cosine factor of the slip ratio."""
+    return Fy0 * np.cos(p['r_By1'] * np.abs(kappa))
+
+
+def _moments(p, Fz, Fy, gamma):
+    """Simplified overturning, rolling resistance and self-aligning moments (Mx, My, Mz)."""
+    Mx = Fz * gamma * 0.01
+    My = -0.01 * Fz * p['R_e']
+    Mz = -0.05 * Fy * p['R_0']  # simplified pneumatic trail
+    return Mx, My, Mz
+
+
 class MagicFormulaTire:
     def __init__(self, tire_name, tire_file_path=None):
         # Simplified tire parameters for a racing tire (like Hoosier)
@@ -123,9 +163,7 @@ class MagicFormulaTire:
             temp = self.temperature
             
         # Calculate temperature effect on grip (bell curve)
-        temp_effect = 1.0 - self.params['grip_temp_factor'] * (
-            (temp - self.params['temp_opt'])**2 / (self.params['temp_range']**2))
-        temp_effect = max(0.5, min(1.0, temp_effect))  # Limit reduction
+        temp_effect = _temperature_effect(self.params, temp)
        
         # Normalized vertical load
         Fz0 = self.params['F_z0']
@@ -142,14 +180,8 @@ class MagicFormulaTire:
         Fx = self._calculate_Fx_combined(kappa, alpha, Fx0)
         Fy = self._calculate_Fy_combined(kappa, alpha, Fy0)
         
-        # Calculate self-aligning moment (simplified)
-        Mz = -0.05 * Fy * self.params['R_0']  # simplified pneumatic trail
-        
-        # Rolling resistance moment (simplified)
-        My = -0.01 * Fz * self.params['R_e']
-        
-        # Overturning moment (simplified)
-        Mx = Fz * gamma * 0.01
+        # Self-aligning, rolling resistance and overturning moments (simplified)
+        Mx, My, Mz = _moments(self.params, Fz, Fy, gamma)
         
         return {
             'Fx': Fx,
@@ -162,48 +194,21 @@ class MagicFormulaTire:
     
     def _calculate_Fx0(self, kappa, Fz, dfz, temp_effect):
         """Calculate pure longitudinal force Fx0 with simplified parameters."""
-        p = self.params
-        
-        # Apply the Magic Formula with reduced parameter set
-        B = p['p_Kx1'] * (1 + p['p_Kx2'] * dfz) * Fz / (p['p_Cx1'] * p['p_Dx1'] * Fz)
-        C = p['p_Cx1']
-        D = p['p_Dx1'] * Fz * (1 + p['p_Dx2'] * dfz) * p['lambda_mux'] * temp_effect
-        E = p['p_Ex1']
-        
-        # Apply the Magic Formula equation
-        Fx0 = D * math.sin(C * math.atan(B * kappa - E * (B * kappa - math.atan(B * kappa))))
-        
-        return Fx0
+        return _pure_longitudinal_force(self.params, kappa, Fz, dfz, temp_effect)
     
     def _calculate_Fy0(self, alpha, Fz, dfz, gamma, temp_effect):
         """Calculate pure lateral force Fy0 with simplified parameters."""
-        p = self.params
-        
-        # Camber effect (simplified)
-        gamma_effect = 0.1 * gamma  # Simple camber thrust component
-        
-        # Apply the Magic Formula with reduced parameter set
-        B = p['p_Ky1'] * Fz / (p['p_Cy1'] * p['p_Dy1'] * Fz * p['p_Ky2'])
-        C = p['p_Cy1']
-        D = abs(p['p_Dy1']) * Fz * (1 + p['p_Dy2'] * dfz) * p['lambda_muy'] * temp_effect
-        E = p['p_Ey1']
-        
-        # Apply the Magic Formula equation
-        Fy0 = D * math.sin(C * math.atan(B * alpha - E * (B * alpha - math.atan(B * alpha)))) + gamma_effect * Fz
-        
-        return Fy0
+        return _pure_lateral_force(self.params, alpha, Fz, dfz, gamma, temp_effect)
     
     def _calculate_Fx_combined(self, kappa, alpha, Fx0):
         """Calculate combined longitudinal force with simplified approach."""
         # Simple cosine reduction of longitudinal force with slip angle
-        reduction = math.cos(self.params['r_Bx1'] * abs(alpha))
-        return Fx0 * reduction
+        return _combined_longitudinal_force(self.params, alpha, Fx0)
     
     def _calculate_Fy_combined(self, kappa, alpha, Fy0):
         """Calculate combined lateral force with simplified approach."""
         # Simple cosine reduction of lateral force with slip ratio
-        reduction = math.cos(self.params['r_By1'] * abs(kappa))
-        return Fy0 * reduction
+        return _combined_lateral_force(self.params, kappa, Fy0)
     
     def calculate_transient_slip(self, Vx, Vsx, Vsy, omega, gamma, dt):
         """
@@ -293,29 +298,19 @@ class MagicFormulaTire:
         dfz = (Fz - Fz0) / Fz0
 
         # Calculate temperature effect if needed
-        temp_effect = 1.0
-        if hasattr(self, 'params') and 'temp_opt' in self.params:
-            temp_effect = 1.0 - self.params.get('grip_temp_factor', 0.2) * (
-                (temp - self.params['temp_opt'])**2 / (self.params.get('temp_range', 30.0)**2))
-            temp_effect = max(0.5, min(1.0, temp_effect))
+        temp_effect = _temperature_effect(self.params, temp)
         
         # Create a range of slip ratios to evaluate
         slip_ratios = np.linspace(0.01, 0.30, 50)  # 50 points between 1% and 30% slip
         
-        # Calculate longitudinal force for each slip ratio
-        forces = []
-        for kappa in slip_ratios:
-            # Calculate pure longitudinal force for this slip
-            fx = self._calculate_Fx0(kappa, Fz, dfz, temp_effect)
-            
-            # Apply combined slip effects if there is nonzero slip angle
-            if abs(alpha) > 1e-6:
-                fx = self._calculate_Fx_combined(kappa, alpha, fx)
-                
-            forces.append(fx)
+        # Calculate pure longitudinal force for all slip ratios at once
+        forces = _pure_longitudinal_force(self.params, slip_ratios, Fz, dfz, temp_effect)
+        
+        # Apply combined slip effects if there is nonzero slip angle
+        if abs(alpha) > 1e-6:
+            forces = self._calculate_Fx_combined(slip_ratios, alpha, forces)
         
         # Find slip ratio with maximum force
-        forces = np.array(forces)
         max_index = np.argmax(forces)
         optimal_slip = slip_ratios[max_index]
         
@@ -353,11 +348,7 @@ class MagicFormulaTire:
         dfz = (Fz - Fz0) / Fz0
 
         # Calculate temperature effect
-        temp_effect = 1.0
-        if hasattr(self, 'params') and 'temp_opt' in self.params:
-            temp_effect = 1.0 - self.params.get('grip_temp_factor', 0.2) * (
-                (temp - self.params['temp_opt'])**2 / (self.params.get('temp_range', 30.0)**2))
-            temp_effect = max(0.5, min(1.0, temp_effect))
+        temp_effect = _temperature_effect(self.params, temp)
         
         # Check if we have significant lateral slip that will affect longitudinal capacity
         lateral_limited = abs(alpha) > 0.01  # More than ~0.5 degrees slip angle
@@ -515,3 +506,54 @@ class MagicFormulaTire:
                 alpha = max(-0.5, min(0.5, alpha))
         
         return kappa, alpha
+
+
+class MagicFormulaTireBatch:
+    """
+    Vectorized evaluation of the MagicFormulaTire steady-state model for several tires at once.
+
+    Inputs are arrays (or scalars) that broadcast together, e.g. shape (4,) for the four tires of
+    a car, or (4, N_p) to evaluate N_p scenarios in the same call.
+    """
+    def __init__(self, tire=None, n_tires=4):
+        """
+        Args:
+            tire: MagicFormulaTire whose parameters and temperature are used. A "Racing Tire" if None.
+            n_tires: Number of tires evaluated together.
+        """
+        self.tire = MagicFormulaTire("Racing Tire") if tire is None else tire
+        self.params = self.tire.params
+        self.n_tires = n_tires
+
+    def temperature_effect(self, temp):
+        """Grip factor (0.5-1.0) at the given tire temperature(s) [°C]."""
+        return _temperature_effect(self.params, temp)
+
+    def compute(self, Fz, kappa, alpha, gamma=0.0, Vx=30, temp=None):
+        """
+        Calculate the steady-state forces and moments of all tires.
+
+        Args:
+            Fz: Vertical loads [N]
+            kappa: Longitudinal slip ratios [-]
+            alpha: Side slip angles [rad]
+            gamma: Camber angles [rad]
+            Vx: Longitudinal velocities [m/s] (unused by the simplified model)
+            temp: Tire temperatures [°C], if None uses the tire's temperature
+
+        Returns:
+            Array of shape (5, ...) with the rows Fx, Fy, Mx, My, Mz.
+        """
+        p = self.params
+        temp_effect = self.temperature_effect(self.tire.temperature if temp is None else temp)
+        Fz = np.asarray(Fz, dtype=np.float64)
+        dfz = (Fz - p['F_z0']) / p['F_z0']
+
+        # Pure slip forces, reduced by the combined slip cosine factors
+        Fx = _combined_longitudinal_force(p, alpha, _pure_longitudinal_force(p, kappa, Fz, dfz, temp_effect))
+        Fy = _combined_lateral_force(p, kappa, _pure_lateral_force(p, alpha, Fz, dfz, gamma, temp_effect))
+
+        # Simplified moments: overturning, rolling resistance and pneumatic trail
+        Mx, My, Mz = _moments(p, Fz, Fy, gamma)
+
+        return np.stack(np.broadcast_arrays(Fx, Fy, Mx, My, Mz))
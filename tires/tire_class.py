@@ -1,4 +1,5 @@
 # enhanced_tire.py
+import math
 import numpy as np
 import pandas as pd
 from tires.magic_formula_tire import MagicFormulaTire
@@ -69,7 +70,10 @@ class PhysicalTire:
             "Vx": [0.0],
             "longitudinal_mode": ["maintain"]
         }
-        self.history = TimeSeriesStorage(initial_data, force_point_parent.name)
+        # Rows are indexed by the car's step index when the tire belongs to a car, sized like its storages
+        timestep = self.force_point_parent.Car.timestep if self.force_point_parent else None
+        expected_steps = self.force_point_parent.Car.n_steps if self.force_point_parent else 1024
+        self.history = TimeSeriesStorage(initial_data, force_point_parent.name, expected_steps=expected_steps, timestep=timestep)
         
         # Check if lookup table has been generated
         if not self.mf_tire.lookup_table_generated:
@@ -128,14 +132,9 @@ class PhysicalTire:
                 point = np.array([[0.0, smoothed_Fy]])  # Assume no longitudinal force for initial estimate
                 estimated_slip_angle = float(self.mf_tire.alpha_interp(point)[0])
             except Exception as e:
-                logger.warning(f"Warning: Error in slip angle interpolation: {e}")
+                logger.warning("Warning: Error in slip angle interpolation: %s", e)
         
         # Calculate maximum available longitudinal force
-        try:
-            Fz/2
-        except Exception as e:
-            print(e)
-            import pdb; pdb.set_trace()
         max_fx_info = self.mf_tire.calculate_max_longitudinal_force(
             Fz, estimated_slip_angle)
         self.state['max_Fx'] = max_fx_info['max_fx']
@@ -180,7 +179,7 @@ class PhysicalTire:
         
         # Ensure we don't exceed the maximum available longitudinal force
         if abs(smoothed_Fx) > abs(self.state['max_Fx']):
-            smoothed_Fx = np.sign(smoothed_Fx) * abs(self.state['max_Fx'])
+            smoothed_Fx = math.copysign(abs(self.state['max_Fx']), smoothed_Fx)
             
         # Update the tire with the allocated forces
         self.update(smoothed_Fx, smoothed_Fy, Fz, Vx, dt, time)
@@ -257,7 +256,7 @@ class PhysicalTire:
                 self.state['slip_ratio'] = kappa
                 self.state['slip_angle'] = alpha
             except Exception as e:
-                logger.warning(f"Warning: Error in slip interpolation: {e}")
+                logger.warning("Warning: Error in slip interpolation: %s", e)
                 # Fall back to direct calculation
                 direct_forces = self.mf_tire.calculate_steady_state_forces(Fz, self.state['slip_ratio'], self.state['slip_angle'])
                 self.state['Fx'] = direct_forces['Fx']
@@ -281,8 +280,8 @@ class PhysicalTire:
         # Update angular velocity (ω = ω₀ + α * dt)
         self.state['angular_velocity'] += angular_acceleration * dt
         
-        # If time is provided, update history
-        if time is not None and not self.history.get_value("Fx", time):
+        # If time is provided and no force is recorded for it yet, update history
+        if time is not None and not (self.history.has_time(time) and self.history.get_value("Fx", time)):
             history_data = {
                 "Fx": self.state['Fx'],
                 "Fy": self.state['Fy'],
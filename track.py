@@ -2,14 +2,36 @@
 # track.py
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import math
+from helper_functions import njit, NJIT_OPTIONS
+
+
+@njit(**NJIT_OPTIONS)
+def _arc(cx, cy, radius, start_angle, sweep, n):
+    """
+    Points of an arc around (cx, cy), as a (2, n) array of x and y, computed in
+    one pass over evenly spaced angles from start_angle to start_angle + sweep.
+    """
+    arc = np.empty((2, n))
+    step = sweep / (n - 1) if n > 1 else 0.0
+    for i in range(n):
+        angle = start_angle + i * step
+        arc[0, i] = cx + radius * math.cos(angle)
+        arc[1, i] = cy + radius * math.sin(angle)
+    return arc
 
 
 class DynamicGraph:
     def __init__(self, colormap="viridis"):
-        # List to hold (x, y) points.
-        self.points = []
+        # matplotlib is only imported once a graph is made, so the track
+        # geometry and simulation can be used without a GUI backend.
+        import matplotlib.pyplot as plt
+
+        # (N, 2) array of the (x, y) points.
+        self.points = np.empty((0, 2))
+        # Running bounds of the points, updated from each new batch.
+        self.x_min = self.y_min = np.inf
+        self.x_max = self.y_max = -np.inf
         # Create the figure and axis.
         self.fig, self.ax = plt.subplots()
         # Activate interactive mode.
@@ -28,20 +50,17 @@ class DynamicGraph:
 
     def _update_plot(self):
         """Update the scatter plot and adjust the axis limits."""
-        if self.points:
-            # Convert list of tuples to a NumPy array.
-            data = np.array(self.points)
-            x = data[:, 0]
-            y = data[:, 1]
+        if len(self.points):
+            data = self.points
             # Create a color value for each point based on its order.
             colors = np.linspace(0, 1, len(self.points))
             # Update the scatter plot data.
             self.sc.set_offsets(data)
             self.sc.set_array(colors)
 
-            # Calculate bounds of the data.
-            x_min, x_max = np.min(x), np.max(x)
-            y_min, y_max = np.min(y), np.max(y)
+            # Bounds of the data, kept up to date by add_points.
+            x_min, x_max = self.x_min, self.x_max
+            y_min, y_max = self.y_min, self.y_max
 
             # Compute ranges; if all x or all y values are the same, set a base
             # range.
@@ -70,26 +89,39 @@ class DynamicGraph:
 
             # Redraw the canvas.
             self.fig.canvas.draw_idle()
-            # Pause briefly to allow an update in interactive mode.
-            plt.pause(0.1)
+            # Let the GUI process the redraw without sleeping.
+            self.fig.canvas.flush_events()
+
+    def flush(self):
+        """Redraw the graph after points were added with batch=True."""
+        self._update_plot()
 
-    def add_points(self, new_points):
+    def add_points(self, new_points, batch=False):
         """
         Add new points to the graph and update it.
 
         Parameters:
-            new_points: sequence of (x, y) tuples or lists.
+            new_points: sequence of (x, y) tuples or lists, or an (N, 2) array.
+            batch: if True, only store the points; call flush() to redraw.
         """
-        # Validate new_points format.
-        if not all(
-            isinstance(pt, (list, tuple)) and len(pt) == 2 for pt in new_points
-        ):
+        # Validate new_points format through its array shape.
+        data = np.asarray(new_points, dtype=np.float64)
+        if data.size == 0:
+            return
+        if data.ndim != 2 or data.shape[1] != 2:
             raise ValueError("Each point must be a tuple or list of two numbers.")
 
+        # Extend the running bounds with the new points only.
+        self.x_min = min(self.x_min, data[:, 0].min())
+        self.x_max = max(self.x_max, data[:, 0].max())
+        self.y_min = min(self.y_min, data[:, 1].min())
+        self.y_max = max(self.y_max, data[:, 1].max())
+
         # Append the new points.
-        self.points.extend(new_points)
+        self.points = np.concatenate((self.points, data))
         # Update the plot.
-        self._update_plot()
+        if not batch:
+            self._update_plot()
 
 
 class TrackSegment:
@@ -131,6 +163,36 @@ class Track:
         # the left.
         self.coordinate_system = "x-forward, y-left"
 
+    @property
+    def lengths(self):
+        """Segment lengths as a float64 array, for the lap simulation."""
+        return np.array(
+            [float(segment.length) for segment in self.segments], dtype=np.float64
+        )
+
+    @property
+    def curvatures(self):
+        """
+        Signed segment curvatures (1/m) as a float64 array, for the lap
+        simulation: positive to the left, 0.0 for straights.
+        """
+        return np.array(
+            [self._curvature(index, segment) for index, segment in enumerate(self.segments)],
+            dtype=np.float64,
+        )
+
+    @staticmethod
+    def _curvature(index, segment):
+        """Returns the signed curvature of a segment (1/m), 0.0 for straights."""
+        if segment.segment_type not in ("Left", "Right"):
+            return 0.0
+        radius = segment.corner_radius
+        if radius is None or not radius > 0:
+            raise ValueError(
+                f"Segment {index} ({segment!r}) needs a positive corner radius."
+            )
+        return (1.0 if segment.segment_type == "Left" else -1.0) / radius
+
     @classmethod
     def from_csv(cls, file_path):
         """
@@ -159,13 +221,19 @@ class Track:
                     f"Required column '{col}' not found in CSV file."
                 )
 
-        for index, row in df.iterrows():
+        # Plain column arrays, rather than a Series per row from iterrows
+        rows = zip(
+            df.index.tolist(),
+            df["Type"].tolist(),
+            df["Section Length"].tolist(),
+            df["Corner Radius"].tolist(),
+        )
+        for index, segment_type, length, corner_radius in rows:
             try:
-                segment_type = row["Type"]
-                length = float(row["Section Length"])
+                length = float(length)
                 corner_radius = (
-                    float(row["Corner Radius"])
-                    if not pd.isna(row["Corner Radius"])
+                    float(corner_radius)
+                    if not pd.isna(corner_radius)
                     else None
                 )  # Allow None for straight segments
 
@@ -209,8 +277,9 @@ class Track:
                       100).
 
         Returns:
-        A tuple (arc_x, arc_y) where each is a NumPy array containing the x and
-        y coordinates of the points along the arc.
+        A (2, num_points) NumPy array with the rows arc_x and arc_y, the x and y
+        coordinates of the points along the arc (it unpacks as arc_x, arc_y,
+        and its transpose is the (num_points, 2) array of points).
         """
         cx, cy = center
         sx, sy = start
@@ -227,16 +296,10 @@ class Track:
         # Compute the angular sweep; arc_length = radius * angular_sweep
         angular_sweep = arc_length / radius
 
-        # Generate an array of angles from the starting angle to the end angle.
-        angles = np.linspace(
-            start_angle, start_angle + direction * angular_sweep, num_points
-        )
-
         # Compute the (x, y) coordinates of the arc.
-        arc_x = cx + radius * np.cos(angles)
-        arc_y = cy + radius * np.sin(angles)
+        arc = _arc(cx, cy, radius, start_angle, direction * angular_sweep, num_points)
 
-        return arc_x, arc_y
+        return arc
 
     def interpolate_points_by_length(self, start, end, steps_per_unit=4):
         """
@@ -255,6 +318,13 @@ class Track:
         Returns:
             List of tuples representing the interpolated points.
         """
+        line = self.interpolate_line(start, end, steps_per_unit)
+        return list(zip(line[:, 0].tolist(), line[:, 1].tolist()))
+
+    def interpolate_line(self, start, end, steps_per_unit=4):
+        """
+        Same points as interpolate_points_by_length, as an (N, 2) NumPy array.
+        """
         x1, y1 = start
         x2, y2 = end
         # Calculate the Euclidean distance between the two points.
@@ -264,15 +334,9 @@ class Track:
         # Ensure we have at least 1 segment to avoid division by zero.
         segments = max(1, round(distance * steps_per_unit))
 
-        points = []
-        # Interpolate points; there are segments+1 points from 0 to segments.
-        for i in range(segments + 1):
-            t = i / segments  # t ranges from 0.0 to 1.0
-            x = x1 + t * (x2 - x1)
-            y = y1 + t * (y2 - y1)
-            points.append((float(x), float(y)))
-
-        return points
+        # Interpolate points; there are segments+1 points, t from 0.0 to 1.0.
+        t = np.arange(segments + 1) / segments
+        return np.column_stack([x1 + t * (x2 - x1), y1 + t * (y2 - y1)])
 
     def plot_track(self, graph, initial_angle, steps_per_unit=4):
         """Plots the track using the DynamicGraph."""
@@ -283,7 +347,9 @@ class Track:
         # angle in radians
         current_angle = initial_angle
 
-        all_points = [(0, 0)]  # Start at the origin
+        # Chunks of (N, 2) points, stacked once at the end
+        chunks = [np.zeros((1, 2))]  # Start at the origin
+        last_point = (0.0, 0.0)
 
         for index, segment in enumerate(self.segments):
             segment_type = segment.segment_type
@@ -292,31 +358,28 @@ class Track:
 
             if segment_type == "Straight":
                 # Calculate the end point of the straight segment
-                delta_x = np.cos(current_angle) * length
-                delta_y = np.sin(current_angle) * length
+                delta_x = math.cos(current_angle) * length
+                delta_y = math.sin(current_angle) * length
                 end_x = current_x + delta_x
                 end_y = current_y + delta_y
 
                 # Interpolate points along the straight line
-                straightline_points = self.interpolate_points_by_length(
+                straightline_points = self.interpolate_line(
                     (current_x, current_y),
                     (end_x, end_y),
                     steps_per_unit=steps_per_unit,
                 )
 
                 # Avoid duplicate start point and ensure smooth transitions
-                if all_points:
-                    last_point = all_points[-1]
-                    new_points = [
-                        p
-                        for p in straightline_points
-                        if math.hypot(p[0] - last_point[0], p[1] - last_point[1])
-                        > 1e-6  # Adjust threshold as needed
-                    ]  # Avoid duplicate start point
-                else:
-                    new_points = straightline_points
-
-                all_points.extend(new_points)
+                new_points = straightline_points[
+                    np.hypot(straightline_points[:, 0] - last_point[0],
+                             straightline_points[:, 1] - last_point[1])
+                    > 1e-6  # Adjust threshold as needed
+                ]
+
+                chunks.append(new_points)
+                if len(new_points):
+                    last_point = new_points[-1]
 
                 # Update current position
                 current_x, current_y = end_x, end_y
@@ -331,54 +394,48 @@ class Track:
                 # Calculate the center of the arc
                 direction = 1 if segment_type == "Left" else -1  # 1 for left, -1 for right
                 radius = corner_radius  # Use the corner_radius directly
-                center_x = current_x - direction * radius * np.sin(
+                center_x = current_x - direction * radius * math.sin(
                     current_angle
                 )
-                center_y = current_y + direction * radius * np.cos(
+                center_y = current_y + direction * radius * math.cos(
                     current_angle
                 )
 
-                # Construct the arc
-                arc_x, arc_y = self.construct_arc(
+                # Construct the arc, as (N, 2) points
+                arc_points = self.construct_arc(
                     (center_x, center_y),
                     (current_x, current_y),
                     length * direction,
                     num_points=int(length * steps_per_unit),
-                )
+                ).T
 
-                # Convert arc points to a list of tuples
-                arc_points = [
-                    (xp, yp) for xp, yp in zip(arc_x.tolist(), arc_y.tolist())
+                # Avoid duplicate start point and ensure smooth transitions
+                new_points = arc_points[
+                    np.hypot(arc_points[:, 0] - last_point[0],
+                             arc_points[:, 1] - last_point[1])
+                    > 1e-6  # Adjust threshold as needed
                 ]
 
-                # Avoid duplicate start point and ensure smooth transitions
-                if all_points:
-                    last_point = all_points[-1]
-                    new_points = [
-                        p
-                        for p in arc_points
-                        if math.hypot(p[0] - last_point[0], p[1] - last_point[1])
-                        > 1e-6  # Adjust threshold as needed
-                    ]
-                else:
-                    new_points = arc_points
-
-                all_points.extend(new_points)
+                chunks.append(new_points)
+                if len(new_points):
+                    last_point = new_points[-1]
 
                 # Update current position and angle
-                current_x = arc_x[-1]
-                current_y = arc_y[-1]
+                current_x, current_y = arc_points[-1]
                 angular_sweep = length / radius
                 current_angle += direction * angular_sweep
 
             else:
                 print(f"Unknown segment type: {segment_type}")
 
+        all_points = np.vstack(chunks)
         graph.add_points(all_points)
         return all_points
 
 # --- Main Script ---
 def test_plot():
+    import matplotlib.pyplot as plt
+
     graph = DynamicGraph()
     # Load track from CSV
     # track = Track.from_csv("tracks/2021_michigan.csv")
@@ -41,6 +41,27 @@ class TestTrack(unittest.TestCase):
         self.assertEqual(len(track.segments), 3)
         self.assertIsInstance(track.segments[0], TrackSegment)
 
+    def test_segment_arrays(self):
+        segments = [
+            TrackSegment("Straight", 100),
+            TrackSegment("Left", 50, 20),
+            TrackSegment("Right", 75, 30),
+        ]
+        track = Track(segments)
+        np.testing.assert_array_equal(track.lengths, [100, 50, 75])
+        np.testing.assert_allclose(track.curvatures, [0.0, 1 / 20, -1 / 30])
+
+    def test_segment_arrays_invalid_radius(self):
+        # The track still builds, the radius is only checked for the curvatures
+        track = Track([TrackSegment("Straight", 10), TrackSegment("Left", 50)])
+        np.testing.assert_array_equal(track.lengths, [10, 50])
+        with self.assertRaises(ValueError):
+            track.curvatures
+
+        track = Track([TrackSegment("Right", 50, 0)])
+        with self.assertRaises(ValueError):
+            track.curvatures
+
     def test_from_csv_valid(self):
         # Assuming you have a valid CSV file named 'valid_track.csv' in the
         # same directory